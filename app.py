@@ -1,15 +1,19 @@
 import streamlit as st 
-from groq import Groq
 from streamlit_option_menu import option_menu
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
 import os
-from fpdf import FPDF
 import time
 from datetime import datetime, timedelta
 import random
+import uuid
 from dotenv import load_dotenv
+import config
+import telemetry
+from response_cache import ResponseCache, cache_key
+from appointment_store import AppointmentRepository, CONFIRMED
+
+# Heavy dependencies (plotly, pandas, numpy, fpdf, groq) are imported inside
+# the page functions and resource factories that use them, so a page only
+# pays for the modules it renders with.
 
 # Load environment variables
 load_dotenv()
@@ -17,16 +21,72 @@ load_dotenv()
 # Set page config
 st.set_page_config(page_title="Dr. Well", page_icon="👨‍⚕️", layout="wide")
 
-# Initialize Groq API with environment variable
-groq_api_key = os.getenv('GROQ_API_KEY')
-client = Groq(api_key=groq_api_key)
+# Metrics endpoint (Prometheus text format) and optional JSONL mirror, once per process
+@st.cache_resource
+def start_telemetry():
+    if config.METRICS_JSONL:
+        telemetry.enable_jsonl(config.METRICS_JSONL)
+    if config.METRICS_PORT:
+        return telemetry.start_http_server(int(config.METRICS_PORT))
+
+start_telemetry()
+
+# State shared with the other replicas of this app (see shared_state.py).
+# Each script run picks up their changes, which invalidates cached values
+# and calls the subscribers registered by the factories below.
+@st.cache_resource
+def get_shared_state():
+    from shared_state import SharedState, open_backend
+    state = SharedState(open_backend(config.STATE_URL or "sqlite:///" + config.data_path("state.sqlite3")),
+                        poll_interval=config.STATE_POLL_SECONDS)
+    def state_stats():
+        stats = state.stats()
+        return {
+            "drwell_shared_state_cache_hits": ("Shared state reads served from the local cache.", stats["hits"]),
+            "drwell_shared_state_cache_misses": ("Shared state reads that went to the backend.", stats["misses"]),
+            "drwell_shared_state_conflicts": ("Writes rejected because another replica changed the value first.",
+                                              stats["conflicts"]),
+        }
+    telemetry.REGISTRY.register_collector(state_stats)
+    return state
+
+get_shared_state().refresh()
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:12]
+st.session_state.script_runs = st.session_state.get('script_runs', 0) + 1
+telemetry.SCRIPT_RUNS.inc()
+telemetry.SESSION_RERUNS.set(st.session_state.script_runs, session=st.session_state.session_id)
+
+# Initialize Groq API with environment variable. The gateway (client, HTTP
+# pool and rate limiter) is created once per server process, not per rerun.
+@st.cache_resource
+def get_llm_client():
+    from groq_client import GroqGateway
+    gateway = GroqGateway(
+        api_key=os.getenv('GROQ_API_KEY'),
+        requests_per_minute=config.GROQ_REQUESTS_PER_MINUTE,
+        tokens_per_minute=config.GROQ_TOKENS_PER_MINUTE,
+        max_retries=config.GROQ_MAX_RETRIES,
+        pool_size=config.GROQ_POOL_SIZE,
+    )
+    def limiter_stats():
+        stats = gateway.stats()
+        return {
+            "drwell_llm_queue_depth": ("Requests waiting on the Groq rate limiter.", stats["queue_depth"]),
+            "drwell_llm_queue_wait_avg_seconds": ("Average rate limiter wait per request.", stats["avg_wait"]),
+            "drwell_llm_queue_wait_max_seconds": ("Longest rate limiter wait so far.", stats["max_wait"]),
+            "drwell_llm_retries": ("Groq requests retried after a retryable error.", stats["retries"]),
+        }
+    telemetry.REGISTRY.register_collector(limiter_stats)
+    return gateway
 
 # Initialize session state for navigation
 if 'page' not in st.session_state:
     st.session_state.page = "Dashboard"
 
-# --- Initialize Appointments Data in Session State ---
+# --- Demo data used to seed the persistent stores ---
 def generate_dummy_data():
+    import pandas as pd
     dates = pd.date_range(end=datetime.now(), periods=30, freq='D')
     health_metrics = pd.DataFrame({
         'Date': dates,
@@ -35,43 +95,406 @@ def generate_dummy_data():
         'Sleep Hours': [random.randint(5, 9) for _ in range(30)],
         'Steps': [random.randint(5000, 15000) for _ in range(30)]
     })
-    
-    appointments = [
-        {"id": 1, "doctor": "Dr. Sarah Smith", "specialty": "Cardiologist", "date": "2024-03-01", "time": "10:00 AM", "status": "Scheduled"},
-        {"id": 2, "doctor": "Dr. John Davis", "specialty": "Dermatologist", "date": "2024-03-15", "time": "2:30 PM", "status": "Scheduled"},
-        {"id": 3, "doctor": "Dr. Emily Wilson", "specialty": "Nutritionist", "date": "2024-03-20", "time": "11:15 AM", "status": "Scheduled"}
+    return health_metrics, dummy_appointments(), dummy_medications()
+
+def dummy_appointments():
+    today = datetime.now().date()
+    return [
+        {"doctor": "Dr. Sarah Smith", "specialty": "Cardiologist", "date": str(today + timedelta(days=3)), "time": "10:00", "status": "Scheduled"},
+        {"doctor": "Dr. John Davis", "specialty": "Dermatologist", "date": str(today + timedelta(days=17)), "time": "14:30", "status": "Scheduled"},
+        {"doctor": "Dr. Emily Wilson", "specialty": "Nutritionist", "date": str(today + timedelta(days=22)), "time": "11:15", "status": "Scheduled"}
     ]
-    
-    medications = [
+
+def dummy_medications():
+    return [
         {"name": "Vitamin D", "dosage": "1000 IU", "frequency": "Daily", "remaining": 45},
         {"name": "Omega-3", "dosage": "500mg", "frequency": "Twice daily", "remaining": 30},
         {"name": "Multivitamin", "dosage": "1 tablet", "frequency": "Daily", "remaining": 60}
     ]
-    
-    return health_metrics, appointments, medications
 
-if 'appointments_data' not in st.session_state:
-    _, appointments, _ = generate_dummy_data()
-    st.session_state["appointments_data"] = appointments
+# Persistent health metrics, seeded with the demo series on first start
+@st.cache_resource
+def get_metrics_store():
+    from metrics_store import MetricsStore
+    store = MetricsStore(os.path.join(config.DATA_DIR, "metrics"))
+    state = get_shared_state()
+    store.subscribe(lambda patient, ts, cols: state.notify(f"metrics:{patient}"))
+    if store.bounds(config.PATIENT_ID) is None:
+        health_metrics, _, _ = generate_dummy_data()
+        store.append(config.PATIENT_ID, health_metrics['Date'].values,
+                     {name: health_metrics[name].values for name in health_metrics.columns if name != 'Date'})
+    return store
+
+# Day/month aggregates of the metrics store, kept current on every append
+@st.cache_resource
+def get_rollups():
+    from rollups import Rollups
+    return Rollups(get_metrics_store(), os.path.join(config.DATA_DIR, "rollups"))
+
+@st.cache_resource
+def get_report_engine():
+    from report_engine import ReportEngine
+    return ReportEngine(get_rollups())
+
+# "Download My Data" archives, written to disk and reused until the data changes
+@st.cache_resource
+def get_exporter():
+    from export import DataExporter
+    return DataExporter(config.data_path("exports", ""))
+
+# Wearable exports are imported in chunks on a background thread
+@st.cache_resource
+def get_ingestor():
+    from ingest import Ingestor
+    return Ingestor(get_metrics_store())
+
+UPLOAD_FORMATS = {"csv": "csv", "ndjson": "ndjson", "jsonl": "ndjson", "json": None}
+
+DASHBOARD_WINDOWS = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "Last year": 365, "All time": None}
+
+# Trend charts are downsampled server-side (LTTB) to roughly two points per
+# pixel of chart width and switch to WebGL traces for large windows.
+CHART_WIDTH_PX = 1200
+CHART_POINT_BUDGET = 2 * CHART_WIDTH_PX
+WEBGL_THRESHOLD = 5000
+TREND_COLORS = {'Steps': '#636efa', 'Heart Rate': '#e74c3c', 'Blood Pressure': '#3498db', 'Sleep Hours': '#9b59b6'}
+
+def dashboard_range(patient, days):
+    bounds = get_metrics_store().bounds(patient)
+    if bounds is None:
+        return None
+    end = bounds[1] + 1
+    start = bounds[0] if days is None else max(bounds[0], end - days * 86400)
+    return start, end
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def trend_figure(patient, series, start, end, budget, version, title):
+    import numpy as np
+    import plotly.graph_objects as go
+    from downsample import lttb_indices
+    from metrics_store import TIMESTAMP
+    window = get_metrics_store().read(patient, start=np.datetime64(start, 's'),
+                                      end=np.datetime64(end, 's'), columns=list(series))
+    ts = window[TIMESTAMP]
+    webgl = len(ts) > WEBGL_THRESHOLD
+    trace = go.Scattergl if webgl else go.Scatter
+    fig = go.Figure()
+    for name in series:
+        idx = lttb_indices(ts, window[name], budget)
+        line = dict(color=TREND_COLORS[name], width=2)
+        if not webgl and len(idx) <= budget // 4:
+            line['shape'] = 'spline'
+        fig.add_trace(trace(x=ts[idx].astype('datetime64[s]'), y=window[name][idx],
+                            name=name, mode='lines', line=line))
+    fig.update_layout(
+        title=title, plot_bgcolor='#162447', paper_bgcolor='#162447', font_color='#ffffff',
+        title_font_size=20, xaxis=dict(gridcolor='#283747'), yaxis=dict(gridcolor='#283747')
+    )
+    if len(series) == 1:
+        fig.update_layout(xaxis_title='Date', yaxis_title=series[0])
+    return fig
+
+# Rolling 24h / 7-day vital statistics, kept current by the metrics store's
+# append hook, so the cards and Quick Stats never rescan history
+@st.cache_resource
+def get_vitals():
+    from vitals import VitalsMonitor
+    monitor = VitalsMonitor(get_metrics_store(), config.PATIENT_ID)
+    # Samples appended by another replica only reach us through the files
+    get_shared_state().subscribe(f"metrics:{config.PATIENT_ID}", lambda key: monitor.reload())
+    return monitor
+
+VITAL_CARDS = [("Heart Rate", "Heart Rate"), ("Blood Pressure", "Blood Pressure"),
+               ("Sleep Quality", "Sleep Hours"), ("Daily Steps", "Steps")]
+QUICK_STATS = [("💗", "Heart Rate", "Heart Rate"), ("🩺", "BP", "Blood Pressure"), ("👟", "Steps", "Steps")]
+
+def vital_card(title, stats):
+    if stats is None:
+        return f'<div class="metric-card"><h3>{title}</h3><div class="stat-number">--</div><p>No data yet</p></div>'
+    unit = f' <span style="font-size: 1rem;">{stats["unit"]}</span>' if stats["unit"] else ""
+    anomaly = '<p class="status-warning">⚠ Unusual latest reading</p>' if stats["anomaly"] else ""
+    return f"""
+        <div class="metric-card">
+            <h3>{title}</h3>
+            <div class="stat-number">{stats["text"]}{unit}</div>
+            <p class="{stats["css"]}">{stats["label"]}</p>{anomaly}
+        </div>
+        """
+
+def quick_stat(icon, label, stats):
+    value = "--" if stats is None else f'{stats["text"]} {stats["unit"]}'.strip()
+    width = 0 if stats is None else round(stats["gauge"] * 100)
+    return f"""
+            <div style="color: white; margin-bottom: 10px;">
+                <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
+                    <span>{icon} {label}</span>
+                    <span>{value}</span>
+                </div>
+                <div style="background: #1565c0; height: 3px; border-radius: 2px; width: {width}%;"></div>
+            </div>"""
+
+# Persistent appointments, seeded with the demo bookings on first start
+@st.cache_resource
+def get_appointment_repo():
+    repo = AppointmentRepository(config.data_path("appointments.sqlite3"))
+    state = get_shared_state()
+    repo.subscribe(lambda appointment_id: state.notify(f"appointment:{appointment_id}"))
+    if repo.count(config.PATIENT_ID) == 0:
+        for apt in dummy_appointments():
+            repo.add(config.PATIENT_ID, **apt)
+    return repo
+
+# Slot engine over the appointment repository: conflict checks, next free
+# slot per doctor and earliest openings per specialty
+@st.cache_resource
+def get_scheduler():
+    from scheduler import Scheduler
+    scheduler = Scheduler(get_appointment_repo())
+    get_shared_state().subscribe("appointment:", lambda key: scheduler.refresh(int(key.split(":", 1)[1])))
+    return scheduler
+
+# Medication lists live in the shared state store, seeded with the demo list
+@st.cache_resource
+def get_medication_repo():
+    from medication_store import MedicationRepository
+    repo = MedicationRepository(get_shared_state())
+    repo.seed(config.PATIENT_ID, dummy_medications())
+    return repo
+
+SPECIALTIES = ["Cardiology", "Dermatology", "Neurology", "Orthopedics", "General Medicine"]
+
+def specialist(gender, specialty):
+    return f"Dr. {gender} {specialty} Specialist"
+
+def slot_label(date, time_str):
+    moment = datetime.strptime(f"{date} {time_str}", "%Y-%m-%d %H:%M")
+    return f"{moment:%a} {moment.day} {moment:%b}, {moment:%I:%M %p}"
 
 # Helper function to call the AI chat API
-def get_ai_response(prompt, system_role):
+AI_MODEL = "mixtral-8x7b-32768"
+AI_TEMPERATURE = 0.5
+SYSTEM_PROMPT = "You are Dr. Well, an AI medical assistant who provides evidence-based advice and suggestions. Always introduce yourself as Dr. Well and maintain a professional yet friendly tone."
+FALLBACK_RESPONSE = "I apologize, but I'm unable to provide a response at this time. - Dr. Well"
+
+@st.cache_resource
+def get_response_cache():
+    cache = ResponseCache(config.data_path("responses.sqlite3"),
+                          max_entries=config.RESPONSE_CACHE_SIZE, ttl=config.RESPONSE_CACHE_TTL)
+    cache.purge_expired()
+    def response_stats():
+        stats = cache.stats()
+        return {
+            "drwell_response_cache_hit_rate": ("Share of Dr. Well prompts answered from the response cache.", stats["hit_rate"]),
+            "drwell_response_cache_disk_hits": ("Response cache hits read from SQLite rather than memory.", stats["disk_hits"]),
+            "drwell_response_cache_memory_entries": ("Responses held in the in-memory LRU.", stats["memory_entries"]),
+        }
+    telemetry.REGISTRY.register_collector(response_stats)
+    return cache
+
+# Bundled food-substitution guide; answers Dr. Well gives for ingredients it
+# doesn't cover are learned into an overlay file next to the other app data.
+@st.cache_resource
+def get_substitution_index():
+    from substitutions import SubstitutionIndex
+    return SubstitutionIndex(learned_path=config.data_path("learned_substitutions.json"))
+
+# Near-duplicate answers for "Ask a nutrition question"; rephrasings of an
+# earlier question are answered from it instead of calling Groq.
+@st.cache_resource
+def get_semantic_cache():
+    from semantic_cache import SemanticCache
+    cache = SemanticCache(config.data_path("semantic_cache.sqlite3"),
+                          threshold=config.SEMANTIC_CACHE_THRESHOLD, ttl=config.RESPONSE_CACHE_TTL)
+    cache.purge_expired()
+    def semantic_stats():
+        stats = cache.stats()
+        return {
+            "drwell_semantic_cache_hit_rate": ("Share of free-text questions answered from a similar one.", stats["hit_rate"]),
+            "drwell_semantic_cache_near_misses": ("Lookups whose best candidate was below the threshold.", stats["near_misses"]),
+            "drwell_semantic_cache_entries": ("Questions stored in the semantic cache.", stats["entries"]),
+            "drwell_semantic_cache_false_match_rate": ("Share of reviewed matches flagged as wrong.", stats["false_match_rate"]),
+        }
+    telemetry.REGISTRY.register_collector(semantic_stats)
+    return cache
+
+def semantic_scope():
+    return cache_key("", SYSTEM_PROMPT, AI_MODEL, AI_TEMPERATURE)
+
+# Answers given in the middle of a conversation depend on it, so the
+# history is part of their cache key.
+def response_key(prompt, history=()):
+    transcript = "".join(f"{m['role']}: {m['content']}\n" for m in history)
+    return cache_key(transcript + prompt, SYSTEM_PROMPT, AI_MODEL, AI_TEMPERATURE)
+
+# `history` goes between the system prompt and the question, oldest first
+def build_messages(prompt, history=()):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *history,
+        {"role": "user", "content": prompt}
+    ]
+
+# Token-budgeted Nutrition chat history, one per browser session
+@st.cache_resource
+def get_conversations():
+    from conversation import ConversationStore
+    store = ConversationStore(budget=config.CHAT_MEMORY_TOKENS, summary_budget=config.CHAT_SUMMARY_TOKENS,
+                              idle_seconds=config.CHAT_IDLE_SECONDS)
+    def conversation_stats():
+        stats = store.stats()
+        return {
+            "drwell_chat_sessions": ("Sessions holding Nutrition chat history.", stats["sessions"]),
+            "drwell_chat_history_tokens": ("Estimated tokens of chat history held across sessions.", stats["tokens"]),
+            "drwell_chat_sessions_evicted": ("Chat histories dropped for idleness or capacity.", stats["evicted"]),
+        }
+    telemetry.REGISTRY.register_collector(conversation_stats)
+    return store
+
+def chat_memory():
+    return get_conversations().get(st.session_state.session_id)
+
+def record_usage(system_role, usage):
+    if usage is not None:
+        telemetry.record_tokens(system_role, getattr(usage, "prompt_tokens", None),
+                                getattr(usage, "completion_tokens", None))
+
+def get_ai_response(prompt, system_role, history=()):
+    cache = get_response_cache()
+    key = response_key(prompt, history)
+    cached = cache.get(key)
+    telemetry.cache_lookup("response", cached is not None)
+    if cached is not None:
+        return cached
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are Dr. Well, an AI medical assistant who provides evidence-based advice and suggestions. Always introduce yourself as Dr. Well and maintain a professional yet friendly tone."},
-                {"role": "user", "content": prompt}
-            ],
-            model="mixtral-8x7b-32768",
-            temperature=0.5,
+        with telemetry.timed(telemetry.LLM_LATENCY_SECONDS, system_role=system_role, mode="blocking"):
+            chat_completion = get_llm_client().create(
+                messages=build_messages(prompt, history),
+                model=AI_MODEL,
+                temperature=AI_TEMPERATURE,
+                max_tokens=1024,
+            )
+        record_usage(system_role, chat_completion.usage)
+        response = chat_completion.choices[0].message.content
+        cache.set(key, response)
+        return response
+    except Exception as e:
+        telemetry.LLM_ERRORS.inc(system_role=system_role)
+        st.error(f"Error in AI response: {str(e)}")
+        return FALLBACK_RESPONSE
+
+# asyncio variant for fanning out several prompts at once (report
+# narratives). Runs on the gateway's event loop thread, so it takes the
+# gateway and cache as arguments and errors are raised, not shown.
+async def get_ai_response_async(prompt, system_role, gateway, cache, history=()):
+    key = response_key(prompt, history)
+    cached = cache.get(key)
+    telemetry.cache_lookup("response", cached is not None)
+    if cached is not None:
+        return cached
+    try:
+        with telemetry.timed(telemetry.LLM_LATENCY_SECONDS, system_role=system_role, mode="async"):
+            chat_completion = await gateway.acreate(
+                messages=build_messages(prompt, history),
+                model=AI_MODEL,
+                temperature=AI_TEMPERATURE,
+                max_tokens=1024,
+            )
+    except Exception:
+        telemetry.LLM_ERRORS.inc(system_role=system_role)
+        raise
+    record_usage(system_role, chat_completion.usage)
+    response = chat_completion.choices[0].message.content
+    cache.set(key, response)
+    return response
+
+# Writes the sections of "AI Health Narrative" reports concurrently
+@st.cache_resource
+def get_narrator():
+    from narrative import Narrator
+    gateway, cache = get_llm_client(), get_response_cache()
+    def ask(prompt):
+        return get_ai_response_async(prompt, "report_narrator", gateway, cache)
+    return Narrator(ask, gateway.run_async, concurrency=config.REPORT_AI_CONCURRENCY,
+                    timeout=config.REPORT_AI_SECTION_TIMEOUT)
+
+# Streaming variant: yields text chunks as they arrive and records
+# time-to-first-token / total latency in st.session_state["ai_latency"].
+# If the stream fails before the first chunk, falls back to get_ai_response.
+def stream_ai_response(prompt, system_role, history=()):
+    timing = {"system_role": system_role, "ttft": None, "total": None, "streamed": True, "cached": False}
+    started = time.perf_counter()
+    cache = get_response_cache()
+    key = response_key(prompt, history)
+    cached = cache.get(key)
+    telemetry.cache_lookup("response", cached is not None)
+    if cached is not None:
+        timing.update(streamed=False, cached=True, ttft=time.perf_counter() - started)
+        timing["total"] = timing["ttft"]
+        record_ai_latency(timing)
+        yield cached
+        return
+    received = False
+    chunks = []
+    try:
+        stream = get_llm_client().create(
+            messages=build_messages(prompt, history),
+            model=AI_MODEL,
+            temperature=AI_TEMPERATURE,
             max_tokens=1024,
+            stream=True,
         )
-        return chat_completion.choices[0].message.content
+        for chunk in stream:
+            x_groq = getattr(chunk, "x_groq", None)
+            if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                record_usage(system_role, x_groq.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if not received:
+                timing["ttft"] = time.perf_counter() - started
+                telemetry.LLM_TTFT_SECONDS.observe(timing["ttft"], system_role=system_role)
+                received = True
+            chunks.append(delta)
+            yield delta
+        if chunks:
+            cache.set(key, "".join(chunks))
     except Exception as e:
-        st.error(f"Error in AI response: {str(e)}")
-        return "I apologize, but I'm unable to provide a response at this time. - Dr. Well"
+        telemetry.LLM_ERRORS.inc(system_role=system_role)
+        if received:
+            st.error(f"Error in AI response: {str(e)}")
+        else:
+            timing["streamed"] = False
+            response = get_ai_response(prompt, system_role, history)
+            timing["ttft"] = time.perf_counter() - started
+            yield response
+    finally:
+        timing["total"] = time.perf_counter() - started
+        # A stream that ended without any text has no first token
+        if timing["ttft"] is None:
+            timing["ttft"] = timing["total"]
+        if timing["streamed"]:
+            telemetry.LLM_LATENCY_SECONDS.observe(timing["total"], system_role=system_role, mode="stream")
+        record_ai_latency(timing)
+
+def record_ai_latency(timing, keep=50):
+    history = st.session_state.setdefault("ai_latency", [])
+    history.append(timing)
+    del history[:-keep]
 
 # Sidebar and Navigation
+PAGES = [
+    "Dashboard", 
+    "Consultations", 
+    "Nutrition", 
+    "Medications",
+    "Appointments",
+    "Reports",
+    "Settings",
+    "About"
+]
+
 with st.sidebar:
     st.markdown("""
         <div style="text-align: center; padding: 20px 0; background: linear-gradient(135deg, #1a237e 0%, #0d47a1 100%); border-radius: 10px; margin-bottom: 20px;">
@@ -81,18 +504,11 @@ with st.sidebar:
         </div>
     """, unsafe_allow_html=True)
     
+    # ?page=<name> deep-links to a page (also used by the benchmarks)
+    requested_page = st.query_params.get("page")
     selected = option_menu(
         menu_title=None,
-        options=[
-            "Dashboard", 
-            "Consultations", 
-            "Nutrition", 
-            "Medications",
-            "Appointments",
-            "Reports",
-            "Settings",
-            "About"
-        ],
+        options=PAGES,
         icons=[
             "speedometer2",
             "chat-dots", 
@@ -105,7 +521,7 @@ with st.sidebar:
             "info-circle"
         ],
         menu_icon="hospital",
-        default_index=0,
+        default_index=PAGES.index(requested_page) if requested_page in PAGES else 0,
         styles={
             "container": {"padding": "0!important", "background-color": "transparent"},
             "icon": {"color": "#90caf9", "font-size": "20px"},
@@ -119,39 +535,30 @@ with st.sidebar:
         }
     )
     
-    st.markdown("""
+    vitals = get_vitals()
+    rows = "".join(quick_stat(icon, label, vitals.summary(name)) for icon, label, name in QUICK_STATS).strip()
+    st.markdown(f"""
         <div style="background: rgba(26, 35, 126, 0.2); border-radius: 10px; padding: 15px; margin-top: 20px;">
             <h4 style="color: #90caf9; margin-bottom: 15px;">Quick Stats</h4>
-            <div style="color: white; margin-bottom: 10px;">
-                <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
-                    <span>💗 Heart Rate</span>
-                    <span>72 BPM</span>
-                </div>
-                <div style="background: #1565c0; height: 3px; border-radius: 2px; width: 80%;"></div>
-            </div>
-            <div style="color: white; margin-bottom: 10px;">
-                <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
-                    <span>🩺 BP</span>
-                    <span>120/80</span>
-                </div>
-                <div style="background: #1565c0; height: 3px; border-radius: 2px; width: 90%;"></div>
-            </div>
-            <div style="color: white;">
-                <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
-                    <span>👟 Steps</span>
-                    <span>8,543</span>
-                </div>
-                <div style="background: #1565c0; height: 3px; border-radius: 2px; width: 70%;"></div>
-            </div>
+            {rows}
         </div>
     """, unsafe_allow_html=True)
     
-    st.markdown("""
+    next_apt = get_appointment_repo().upcoming(config.PATIENT_ID, datetime.now().date(), limit=1)
+    if next_apt:
+        next_apt = next_apt[0]
+        next_date = datetime.strptime(next_apt.date, "%Y-%m-%d")
+        next_date = f"{next_date:%B} {next_date.day}, {next_date:%Y}"
+        next_details = f"""
+            <p style="color: #90caf9; margin-bottom: 5px;">{next_apt.doctor}</p>
+            <p style="color: white; margin-bottom: 5px;">📅 {next_date}</p>
+            <p style="color: white;">⏰ {next_apt.display_time}</p>"""
+    else:
+        next_details = """
+            <p style="color: #90caf9; margin-bottom: 5px;">No upcoming appointments</p>"""
+    st.markdown(f"""
         <div style="background: linear-gradient(135deg, #1565c0 0%, #1976d2 100%); border-radius: 10px; padding: 15px; margin-top: 20px;">
-            <h4 style="color: white; margin-bottom: 10px;">Next Appointment</h4>
-            <p style="color: #90caf9; margin-bottom: 5px;">Dr. Sarah Smith</p>
-            <p style="color: white; margin-bottom: 5px;">📅 March 1, 2024</p>
-            <p style="color: white;">⏰ 10:00 AM</p>
+            <h4 style="color: white; margin-bottom: 10px;">Next Appointment</h4>{next_details}
         </div>
     """, unsafe_allow_html=True)
     
@@ -164,11 +571,13 @@ with st.sidebar:
     
     if selected:
         st.session_state.page = selected
+        # Kept in the URL too, so a reconnect to another replica (or after a
+        # restart) reopens the same page
+        if requested_page != selected:
+            st.query_params["page"] = selected
 
 # Page functions
 def dashboard():
-    health_metrics, _, _ = generate_dummy_data()
-    
     st.markdown("""
     <div class="welcome-header">
         <h1>👋 Welcome to Dr. Well</h1>
@@ -176,64 +585,79 @@ def dashboard():
     </div>
     """, unsafe_allow_html=True)
     
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>Heart Rate</h3>
-            <div class="stat-number">72 <span style="font-size: 1rem;">BPM</span></div>
-            <p class="status-normal">✓ Normal Range</p>
-        </div>
-        """, unsafe_allow_html=True)
-    with col2:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>Blood Pressure</h3>
-            <div class="stat-number">120/80</div>
-            <p class="status-normal">✓ Optimal</p>
-        </div>
-        """, unsafe_allow_html=True)
-    with col3:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>Sleep Quality</h3>
-            <div class="stat-number">7.5 <span style="font-size: 1rem;">hrs</span></div>
-            <p class="status-normal">✓ Well Rested</p>
-        </div>
-        """, unsafe_allow_html=True)
-    with col4:
-        st.markdown("""
-        <div class="metric-card">
-            <h3>Daily Steps</h3>
-            <div class="stat-number">8,543</div>
-            <p class="status-warning">! Below Target</p>
-        </div>
-        """, unsafe_allow_html=True)
+    vitals = get_vitals()
+    for col, (title, name) in zip(st.columns(4), VITAL_CARDS):
+        with col:
+            st.markdown(vital_card(title, vitals.summary(name)), unsafe_allow_html=True)
 
     st.markdown("<h2 class='section-header'>Health Trends</h2>", unsafe_allow_html=True)
+    health_trends()
+
+    with st.expander("📥 Import Wearable Data"):
+        wearable_import()
+
+# Interactive page sections are fragments: a widget inside one re-runs only
+# that section, not the sidebar, CSS, headers or the page router.
+@st.fragment
+def health_trends():
+    window = st.selectbox("Time window", list(DASHBOARD_WINDOWS), index=1)
+    chart_range = dashboard_range(config.PATIENT_ID, DASHBOARD_WINDOWS[window])
+    if chart_range is None:
+        st.info("No health metrics recorded yet.")
+        return
+    version = get_metrics_store().version(config.PATIENT_ID)
     tab1, tab2 = st.tabs(["📊 Activity Metrics", "💗 Vital Signs"])
     with tab1:
-        fig_steps = px.line(health_metrics, x='Date', y='Steps', title='Daily Steps', line_shape='spline')
-        fig_steps.update_layout(
-            plot_bgcolor='#162447', paper_bgcolor='#162447', font_color='#ffffff',
-            title_font_size=20, xaxis=dict(gridcolor='#283747'), yaxis=dict(gridcolor='#283747')
-        )
+        fig_steps = trend_figure(config.PATIENT_ID, ('Steps',), *chart_range,
+                                 CHART_POINT_BUDGET, version, 'Daily Steps')
         st.plotly_chart(fig_steps, use_container_width=True)
     with tab2:
-        fig_vitals = go.Figure()
-        fig_vitals.add_trace(go.Scatter(x=health_metrics['Date'], 
-                                        y=health_metrics['Heart Rate'], name='Heart Rate',
-                                        line=dict(color='#e74c3c', width=2)))
-        fig_vitals.add_trace(go.Scatter(x=health_metrics['Date'], 
-                                        y=health_metrics['Blood Pressure'], name='Blood Pressure',
-                                        line=dict(color='#3498db', width=2)))
-        fig_vitals.update_layout(
-            title='Vital Signs Trend', plot_bgcolor='#162447', paper_bgcolor='#162447',
-            font_color='#ffffff', title_font_size=20, xaxis=dict(gridcolor='#283747'),
-            yaxis=dict(gridcolor='#283747')
-        )
+        fig_vitals = trend_figure(config.PATIENT_ID, ('Heart Rate', 'Blood Pressure'), *chart_range,
+                                  CHART_POINT_BUDGET, version, 'Vital Signs Trend')
         st.plotly_chart(fig_vitals, use_container_width=True)
 
+# The upload is spooled to disk and handed to the ingestor, which owns the
+# file from then on; the page polls the job instead of waiting on it.
+@st.fragment
+def wearable_import():
+    import shutil
+    st.caption("CSV, NDJSON or a JSON array with a timestamp column and any of: "
+               "heart rate, blood pressure, sleep hours, steps.")
+    upload = st.file_uploader("Wearable export", type=list(UPLOAD_FORMATS))
+    if upload is not None and st.button("Import"):
+        extension = upload.name.rsplit(".", 1)[-1].lower()
+        path = config.data_path("uploads", f"{uuid.uuid4().hex}.{extension}")
+        upload.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(upload, f, 1 << 20)
+        st.session_state["ingest_job"] = get_ingestor().submit(
+            config.PATIENT_ID, path, name=upload.name, fmt=UPLOAD_FORMATS.get(extension))
+    job = st.session_state.get("ingest_job")
+    polling = job is not None and not job.done()
+    st.fragment(run_every=0.5 if polling else None)(ingest_status)(polling)
+
+# Re-runs on a timer while the import is running; the whole page re-runs
+# once it finishes so the cards and charts pick up the new data
+def ingest_status(polling):
+    job = st.session_state.get("ingest_job")
+    if job is None:
+        return
+    if not job.done():
+        st.progress(job.progress, text=f"{job.name}: {job.message}")
+        return
+    if polling:
+        st.rerun()
+    error = job.error()
+    if error is not None:
+        st.error(f"Could not import {job.name}: {error}")
+        return
+    st.success(f"Imported {job.rows_written:,} readings from {job.name}.")
+    skipped = [f"{count:,} {label}" for count, label in
+               ((job.rejected, "rows without a valid timestamp or reading"),
+                (job.duplicates, "duplicate timestamps")) if count]
+    if skipped:
+        st.caption("Skipped " + " and ".join(skipped) + ".")
+
 def consultations():
     st.markdown("""
     <div class="welcome-header">
@@ -242,15 +666,15 @@ def consultations():
     </div>
     """, unsafe_allow_html=True)
     
-    confirmed = [apt for apt in st.session_state["appointments_data"] if apt["status"] == "Confirmed"]
+    confirmed = get_appointment_repo().confirmed(config.PATIENT_ID)
     if confirmed:
         st.markdown("<h2 class='section-header'>Running Consultations</h2>", unsafe_allow_html=True)
         for apt in confirmed:
             st.markdown(f"""
             <div class="appointment-card">
-                <h4>🏥 {apt['doctor']} - {apt['specialty']}</h4>
-                <p>📅 {apt['date']} at {apt['time']}</p>
-                <p style="color: #4CAF50; font-weight: bold;">Status: {apt['status']}</p>
+                <h4>🏥 {apt.doctor} - {apt.specialty}</h4>
+                <p>📅 {apt.date} at {apt.display_time}</p>
+                <p style="color: #4CAF50; font-weight: bold;">Status: {apt.status}</p>
             </div>
             """, unsafe_allow_html=True)
     else:
@@ -266,36 +690,152 @@ def nutrition():
     
     st.markdown("### Chat with Dr. Well")
     st.markdown("_Your personal AI nutrition advisor_")
-    
+    nutrition_chat()
+    st.markdown("<p>Here you can view and manage your nutrition plans.</p>", unsafe_allow_html=True)
+
+@st.fragment
+def nutrition_chat():
+    memory = chat_memory()
+    if memory.transcript:
+        if memory.summary:
+            st.caption(f"{len(memory.summary)} earlier exchanges summarized for Dr. Well")
+        for question, answer in memory.transcript:
+            with st.chat_message("user"):
+                st.write(question)
+            with st.chat_message("assistant", avatar="👨‍⚕️"):
+                st.markdown(answer)
+        st.button("Start a new conversation", on_click=memory.clear)
     chatbot_option = st.selectbox("How can I help you today?", 
                                    ["Ask a nutrition question", "Get a healthy recipe", "Calculate daily calories", "Find food substitutes"])
     
     user_input = ""
     if chatbot_option == "Ask a nutrition question":
         user_input = st.text_input("What would you like to know about nutrition?")
+        if st.session_state.pop("semantic_flagged", False):
+            st.info("Thanks for the feedback. Ask again and Dr. Well will answer your exact question.")
     elif chatbot_option == "Get a healthy recipe":
         user_input = "Could you suggest a healthy recipe that's high in protein, low in carbs, and vegetarian?"
         st.info("I'll help you find a healthy recipe that matches your preferences.")
     elif chatbot_option == "Calculate daily calories":
-        age = st.number_input("Your age", min_value=10, max_value=100, value=30)
-        weight = st.number_input("Your weight (kg)", min_value=30.0, max_value=200.0, value=70.0)
-        height = st.number_input("Your height (cm)", min_value=100, max_value=250, value=170)
-        user_input = f"Please calculate the daily calorie needs for someone who is {age} years old, weighs {weight} kg, and is {height} cm tall."
+        user_input = calorie_calculator()
+        if not user_input:
+            return
     elif chatbot_option == "Find food substitutes":
-        user_input = st.text_input("What ingredient would you like to substitute?", "sugar")
-        if user_input:
-            user_input = f"What are some healthy substitutes for {user_input} in cooking or baking?"
+        ingredient = st.text_input("What ingredient would you like to substitute?", "sugar")
+        index = get_substitution_index()
+        suggestions = index.suggest(ingredient)
+        if suggestions:
+            st.caption("Did you mean: " + ", ".join(suggestions))
+        if ingredient:
+            user_input = f"What are some healthy substitutes for {ingredient} in cooking or baking?"
     
     if st.button("Ask Dr. Well"):
         if user_input:
             with st.chat_message("user"):
                 st.write(user_input)
             with st.chat_message("assistant", avatar="👨‍⚕️"):
-                response = get_ai_response(user_input, "nutrition_advisor")
-                st.write(response)
+                if chatbot_option == "Find food substitutes":
+                    answer = answer_substitution(index, ingredient, user_input)
+                elif chatbot_option == "Ask a nutrition question":
+                    answer = answer_question(user_input, memory)
+                else:
+                    answer = stream_answer(user_input)
+            if answer and answer != FALLBACK_RESPONSE:
+                memory.add(user_input, answer)
         else:
             st.warning("Please enter your question or select an option above.")
-    st.markdown("<p>Here you can view and manage your nutrition plans.</p>", unsafe_allow_html=True)
+
+# Streams Dr. Well's answer and returns it. Only follow-up questions carry
+# the conversation (`history`); fixed prompts go out alone, so repeats are
+# answered from the response cache.
+def stream_answer(prompt, history=()):
+    answer = st.write_stream(stream_ai_response(prompt, "nutrition_advisor", history))
+    timing = st.session_state["ai_latency"][-1]
+    source = "cache" if timing["cached"] else "Groq"
+    st.caption(f"First token in {timing['ttft']:.2f}s · complete in {timing['total']:.2f}s ({source})")
+    return answer if isinstance(answer, str) else "".join(map(str, answer))
+
+# Served from the local substitution index when the ingredient is known;
+# misses go to Dr. Well and the answer is added to the index.
+def answer_substitution(index, ingredient, prompt):
+    from substitutions import format_answer
+    started = time.perf_counter()
+    match = index.lookup(ingredient)
+    telemetry.cache_lookup("substitutions", match is not None)
+    if match is not None:
+        st.markdown(format_answer(match))
+        matched = "" if match.kind == "exact" else f", matched \"{match.matched}\""
+        st.caption(f"Answered in {(time.perf_counter() - started) * 1000:.2f}ms from the substitution guide{matched}")
+        return format_answer(match)
+    answer = stream_answer(prompt)
+    if answer and answer != FALLBACK_RESPONSE:
+        index.learn(ingredient, answer)
+    return answer
+
+# Free-text questions that stand on their own are first matched against
+# earlier ones. A hit is shown with the question it matched, and the user
+# can flag it as a false match, which sends their next ask of the same
+# question to Dr. Well. Standalone questions are asked without the
+# conversation and their answers stored; follow-ups (semantic_cache.
+# is_follow_up) are asked with it and never matched or stored.
+def answer_question(question, memory):
+    from semantic_cache import is_follow_up
+    if (memory.summary or memory.turns) and is_follow_up(question):
+        return stream_answer(question, memory.messages())
+    cache = get_semantic_cache()
+    bypass = st.session_state.setdefault("semantic_bypass", set())
+    match = None
+    if question not in bypass:
+        match = cache.lookup(question, semantic_scope())
+        telemetry.cache_lookup("semantic", match is not None)
+    if match is not None:
+        st.markdown(match.answer)
+        st.caption(f"Answered from a similar question: \"{match.question}\" (similarity {match.similarity:.2f})")
+        st.button("Not what I asked", key="semantic_flag", on_click=flag_semantic_match,
+                  args=(match.review_id, question))
+        return match.answer
+    answer = stream_answer(question)
+    bypass.discard(question)
+    if answer and answer != FALLBACK_RESPONSE:
+        cache.add(question, semantic_scope(), answer)
+    return answer
+
+def flag_semantic_match(review_id, question):
+    get_semantic_cache().flag(review_id)
+    st.session_state.setdefault("semantic_bypass", set()).add(question)
+    telemetry.SEMANTIC_REVIEWS.inc(verdict="false_match")
+    st.session_state["semantic_flagged"] = True
+
+# Computed locally (Mifflin-St Jeor / Harris-Benedict); Dr. Well is only asked
+# for a narrative explanation when the user opts in. Returns that prompt or "".
+def calorie_calculator():
+    from nutrition_calc import ACTIVITY_LEVELS, GOALS, MACRO_SPLITS, calorie_plan
+    col1, col2 = st.columns(2)
+    with col1:
+        age = st.number_input("Your age", min_value=10, max_value=100, value=30)
+        weight = st.number_input("Your weight (kg)", min_value=30.0, max_value=200.0, value=70.0)
+        height = st.number_input("Your height (cm)", min_value=100, max_value=250, value=170)
+        sex = st.selectbox("Sex", ["Female", "Male"])
+    with col2:
+        activity = st.selectbox("Activity level", list(ACTIVITY_LEVELS), index=1)
+        goal = st.selectbox("Goal", list(GOALS), index=1)
+        split = st.selectbox("Macro split", list(MACRO_SPLITS))
+        formula = st.radio("Formula", ["mifflin", "harris"], horizontal=True,
+                           format_func={"mifflin": "Mifflin-St Jeor", "harris": "Harris-Benedict"}.get)
+    plan = {k: float(v) for k, v in calorie_plan(age, weight, height, sex, activity, goal, split, formula).items()}
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("BMR", f"{plan['bmr']:,.0f} kcal")
+    m2.metric("Maintenance (TDEE)", f"{plan['tdee']:,.0f} kcal")
+    m3.metric("Daily target", f"{plan['target']:,.0f} kcal")
+    m4.metric("BMI", f"{plan['bmi']:.1f}")
+    st.markdown(f"**Macros per day:** {plan['protein']:.0f} g protein · {plan['carbs']:.0f} g carbs · {plan['fat']:.0f} g fat")
+    if not st.checkbox("Ask Dr. Well to explain these numbers"):
+        return ""
+    return (f"A {age}-year-old {sex.lower()} weighing {weight} kg and {height} cm tall, {activity.lower()}, "
+            f"wants to {goal.lower()}. Their BMR is {plan['bmr']:.0f} kcal, maintenance is {plan['tdee']:.0f} kcal "
+            f"and the daily target is {plan['target']:.0f} kcal with {plan['protein']:.0f} g protein, "
+            f"{plan['carbs']:.0f} g carbs and {plan['fat']:.0f} g fat. Briefly explain what these numbers mean "
+            f"and give practical tips for reaching them.")
 
 def health_records():
     st.markdown("""
@@ -340,6 +880,40 @@ def about():
     </div>
     """, unsafe_allow_html=True)
 
+# Page state for the long card lists. The current page lives in
+# st.session_state[key] and goes back to the first page whenever `filters`
+# change; returns the offset of the first row to show.
+def page_offset(key, page_size, filters):
+    if st.session_state.get(f"{key}_filters") != filters:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[key] = 0
+    return st.session_state.setdefault(key, 0) * page_size
+
+# Moves back to the last page when rows disappeared from under the current
+# one; returns True if the page changed and has to be fetched again.
+def clamp_page(key, total, page_size):
+    last = max(0, -(-total // page_size) - 1)
+    if st.session_state[key] > last:
+        st.session_state[key] = last
+        return True
+    return False
+
+def turn_page(key, step):
+    st.session_state[key] += step
+
+def pager(key, total, page_size):
+    page = st.session_state.get(key, 0)
+    pages = max(1, -(-total // page_size))
+    first = page * page_size + 1 if total else 0
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    prev_col.button("◀ Previous", key=f"{key}_prev", disabled=page == 0, on_click=turn_page, args=(key, -1))
+    info_col.caption(f"Showing {first}-{min(total, (page + 1) * page_size)} of {total:,} · page {page + 1} of {pages}")
+    next_col.button("Next ▶", key=f"{key}_next", disabled=page >= pages - 1, on_click=turn_page, args=(key, 1))
+
+MEDICATIONS_PAGE_SIZE = 10
+APPOINTMENTS_PAGE_SIZE = 10
+APPOINTMENT_ORDERS = {"Upcoming first": "upcoming", "Most recent first": "newest", "Oldest first": "oldest"}
+
 def medications():
     st.markdown("""
     <div class="welcome-header">
@@ -347,12 +921,28 @@ def medications():
         <p>Track and manage your medications</p>
     </div>
     """, unsafe_allow_html=True)
-    
-    _, _, medications = generate_dummy_data()
+    medication_list()
+
+@st.fragment
+def medication_list():
+    search_col, filter_col, sort_col = st.columns([2, 1, 1])
+    query = search_col.text_input("Search medications", placeholder="Name").strip().lower()
+    needs_refill = filter_col.selectbox("Show", ["All", "Needs refill"]) == "Needs refill"
+    order = sort_col.selectbox("Sort by", ["Days remaining", "Name"])
+    from medication_store import REFILL_THRESHOLD_DAYS
+    all_medications, _ = get_medication_repo().list(config.PATIENT_ID)
+    medications = [med for med in all_medications
+                   if query in med['name'].lower() and (not needs_refill or med['remaining'] <= REFILL_THRESHOLD_DAYS)]
+    medications.sort(key=(lambda med: med['remaining']) if order == "Days remaining" else (lambda med: med['name'].lower()))
+    page_offset("medications_page", MEDICATIONS_PAGE_SIZE, (query, needs_refill, order))
+    clamp_page("medications_page", len(medications), MEDICATIONS_PAGE_SIZE)
+    offset = st.session_state["medications_page"] * MEDICATIONS_PAGE_SIZE
+    visible = medications[offset:offset + MEDICATIONS_PAGE_SIZE]
+
     col1, col2 = st.columns([2, 1])
     with col1:
         st.markdown("<h2 class='section-header'>Current Medications</h2>", unsafe_allow_html=True)
-        for med in medications:
+        for med in visible:
             st.markdown(f"""
             <div class="medication-card" style="display: flex; justify-content: space-between; align-items: center;">
                 <div>
@@ -360,17 +950,42 @@ def medications():
                     <p>Dosage: {med['dosage']} - {med['frequency']}</p>
                 </div>
                 <div style="text-align: right;">
-                    <p style="color: {'#4CAF50' if med['remaining'] > 30 else '#f39c12'}">
+                    <p style="color: {'#4CAF50' if med['remaining'] > REFILL_THRESHOLD_DAYS else '#f39c12'}">
                         {med['remaining']} days remaining
                     </p>
                 </div>
             </div>
             """, unsafe_allow_html=True)
+        if not visible:
+            st.info("No medications match your search.")
+        pager("medications_page", len(medications), MEDICATIONS_PAGE_SIZE)
     with col2:
         st.markdown("<h2 class='section-header'>Refill Requests</h2>", unsafe_allow_html=True)
-        for med in medications:
-            if med['remaining'] <= 30:
-                st.button(f"Request Refill: {med['name']}")
+        refill_requests([med['name'] for med in visible])
+
+# Re-reads the list (usually from the local cache) so a rerun of just this
+# fragment sees its own refill requests and the current version
+@st.fragment
+def refill_requests(names):
+    from medication_store import REFILL_THRESHOLD_DAYS
+    medications, version = get_medication_repo().list(config.PATIENT_ID)
+    medications = sorted((med for med in medications if med['name'] in names), key=lambda med: names.index(med['name']))
+    if st.session_state.pop("refill_conflict", False):
+        st.warning("Your medication list was changed elsewhere. It has been reloaded; please try again.")
+    for med in medications:
+        if med.get('refill_requested'):
+            st.caption(f"✓ Refill requested for {med['name']} on {med['refill_requested']}")
+        elif med['remaining'] <= REFILL_THRESHOLD_DAYS:
+            st.button(f"Request Refill: {med['name']}", key=f"refill_{med['name']}",
+                      on_click=request_refill, args=(med['name'], version))
+
+# Button callback: the list is re-read on the rerun it triggers
+def request_refill(name, version):
+    from shared_state import VersionConflict
+    try:
+        get_medication_repo().request_refill(config.PATIENT_ID, name, version)
+    except VersionConflict:
+        st.session_state["refill_conflict"] = True
 
 def appointments():
     st.markdown("""
@@ -380,46 +995,145 @@ def appointments():
     </div>
     """, unsafe_allow_html=True)
     
-    appointments_data = st.session_state["appointments_data"]
     col1, col2 = st.columns([2, 1])
     
     with col1:
         st.markdown("<h2 class='section-header'>Upcoming Appointments</h2>", unsafe_allow_html=True)
-        for i, apt in enumerate(appointments_data):
-            st.markdown(f"""
-            <div class="appointment-card">
-                <h4>🏥 {apt['doctor']} - {apt['specialty']}</h4>
-                <p>📅 {apt['date']} at {apt['time']}</p>
-                <p>Status: {apt['status']}</p>
-            """, unsafe_allow_html=True)
-            if apt["status"] == "Scheduled":
-                if st.button("Confirm", key=f"confirm_{apt['id']}"):
-                    st.session_state["appointments_data"][i]["status"] = "Confirmed"
-                    st.success("Appointment confirmed!")
-                    st.rerun()
-                st.button("Reschedule", key=f"reschedule_{apt['id']}")
-            st.markdown("</div>", unsafe_allow_html=True)
+        appointment_list()
     
     with col2:
         st.markdown("<h2 class='section-header'>Schedule New</h2>", unsafe_allow_html=True)
+        schedule_form()
+
+# Filtering, sorting and paging run in SQLite, so only one page of cards and
+# buttons is built however long the patient's history is.
+@st.fragment
+def appointment_list():
+    from appointment_store import CANCELLED, SCHEDULED
+    repo = get_appointment_repo()
+    today = datetime.now().date()
+    search_col, sort_col = st.columns([2, 1])
+    doctor = search_col.text_input("Search by doctor", placeholder="e.g. Cardiology")
+    order = sort_col.selectbox("Sort", list(APPOINTMENT_ORDERS))
+    status_col, past_col = st.columns([2, 1])
+    statuses = status_col.multiselect("Status", [SCHEDULED, CONFIRMED, CANCELLED], default=[SCHEDULED, CONFIRMED])
+    include_past = past_col.checkbox("Include past")
+    filters = (doctor.strip().lower(), order, tuple(statuses), include_past)
+    offset = page_offset("appointments_page", APPOINTMENTS_PAGE_SIZE, filters)
+    page, total = repo.page(config.PATIENT_ID, today, statuses, doctor, include_past,
+                            APPOINTMENT_ORDERS[order], APPOINTMENTS_PAGE_SIZE, offset)
+    if clamp_page("appointments_page", total, APPOINTMENTS_PAGE_SIZE):
+        offset = st.session_state["appointments_page"] * APPOINTMENTS_PAGE_SIZE
+        page, total = repo.page(config.PATIENT_ID, today, statuses, doctor, include_past,
+                                APPOINTMENT_ORDERS[order], APPOINTMENTS_PAGE_SIZE, offset)
+    if st.session_state.pop("appointment_conflict", False):
+        appointment_conflict()
+    for apt in page:
+        st.markdown(f"""
+        <div class="appointment-card">
+            <h4>🏥 {apt.doctor} - {apt.specialty}</h4>
+            <p>📅 {apt.date} at {apt.display_time}</p>
+            <p>Status: {apt.status}</p>
+        """, unsafe_allow_html=True)
+        upcoming = apt.status != CANCELLED and apt.date >= str(today)
+        # Callbacks run before the fragment re-renders, so no extra rerun is needed
+        if upcoming and apt.status == SCHEDULED:
+            st.button("Confirm", key=f"confirm_{apt.id}", on_click=confirm_appointment, args=(apt.id, apt.version))
+            st.button("Reschedule", key=f"reschedule_{apt.id}", on_click=st.session_state.__setitem__,
+                      args=("rescheduling", apt.id))
+        if upcoming:
+            st.button("Cancel appointment", key=f"cancel_{apt.id}", on_click=cancel_appointment,
+                      args=(apt.id, apt.version))
+        if upcoming and st.session_state.get("rescheduling") == apt.id:
+            reschedule_form(apt)
+        st.markdown("</div>", unsafe_allow_html=True)
+    if not page:
+        st.info("No appointments match these filters.")
+    pager("appointments_page", total, APPOINTMENTS_PAGE_SIZE)
+
+# Button callback; a version mismatch means another replica changed the
+# appointment after this page was drawn
+def confirm_appointment(appointment_id, version):
+    from shared_state import VersionConflict
+    try:
+        get_appointment_repo().set_status(appointment_id, CONFIRMED, version)
+    except VersionConflict:
+        st.session_state["appointment_conflict"] = True
+
+# Frees the slot in the scheduler as well, so it can be booked again
+def cancel_appointment(appointment_id, version):
+    from shared_state import VersionConflict
+    try:
+        get_scheduler().cancel(appointment_id, version)
+    except VersionConflict:
+        st.session_state["appointment_conflict"] = True
+
+def appointment_conflict():
+    st.warning("This appointment was changed elsewhere. The list shows the latest version; please try again.")
+
+def slot_error(error):
+    if error.suggestion:
+        st.error(f"{error} The next free slot is {slot_label(*error.suggestion)}.")
+    else:
+        st.error(str(error))
+
+# Offers the doctor's next free slot; the move itself is atomic in Scheduler
+def reschedule_form(apt):
+    from scheduler import SlotUnavailable
+    from shared_state import VersionConflict
+    scheduler = get_scheduler()
+    now = datetime.now()
+    free_date, free_time = scheduler.next_free(apt.doctor, now.strftime("%Y-%m-%d"), now.strftime("%H:%M"))
+    date_col, time_col = st.columns(2)
+    date = date_col.date_input("New date", datetime.strptime(free_date, "%Y-%m-%d"), min_value=now.date(),
+                               key=f"reschedule_date_{apt.id}")
+    time_val = time_col.time_input("New time", datetime.strptime(free_time, "%H:%M").time(), step=timedelta(minutes=30),
+                                   key=f"reschedule_time_{apt.id}")
+    save_col, cancel_col = st.columns(2)
+    if save_col.button("Save", key=f"reschedule_save_{apt.id}"):
+        try:
+            scheduler.reschedule(apt.id, date.strftime("%Y-%m-%d"), time_val.strftime("%H:%M"), apt.version)
+        except SlotUnavailable as e:
+            slot_error(e)
+        except VersionConflict:
+            st.session_state["appointment_conflict"] = True
+            del st.session_state["rescheduling"]
+            st.rerun()
+        else:
+            del st.session_state["rescheduling"]
+            # The sidebar's Next Appointment card may change too
+            st.rerun()
+    cancel_col.button("Cancel", key=f"reschedule_cancel_{apt.id}", on_click=st.session_state.pop, args=("rescheduling", None))
+
+@st.fragment
+def schedule_form():
+    from scheduler import SlotUnavailable
+    scheduler = get_scheduler()
+    now = datetime.now()
+    specialty = st.selectbox("Select Specialty", SPECIALTIES)
+    openings = scheduler.earliest(specialty, now.strftime("%Y-%m-%d"), now.strftime("%H:%M"), k=5,
+                                  doctors=[specialist(gender, specialty) for gender in ("Male", "Female")])
+    slots = {f"{slot_label(d, t)} · {doctor}": (d, t, doctor) for d, t, doctor in openings}
+    custom = "Pick a date and time"
+    choice = st.selectbox("Earliest openings", list(slots) + [custom])
+    if choice == custom:
         # New selection for doctor gender added here
-        specialty = st.selectbox("Select Specialty", ["Cardiology", "Dermatology", "Neurology", "Orthopedics", "General Medicine"])
         doctor_gender = st.selectbox("Select Doctor Gender", ["Male", "Female"])
-        date = st.date_input("Select Date")
-        time_val = st.time_input("Select Time")
-        if st.button("Schedule Appointment"):
-            new_id = max([apt["id"] for apt in appointments_data]) + 1 if appointments_data else 1
-            new_apt = {
-                "id": new_id,
-                "doctor": f"Dr. {doctor_gender} {specialty} Specialist",
-                "specialty": specialty,
-                "date": date.strftime("%Y-%m-%d"),
-                "time": time_val.strftime("%I:%M %p"),
-                "status": "Scheduled"
-            }
-            st.session_state["appointments_data"].append(new_apt)
-            st.success("New appointment scheduled!")
-            st.rerun()
+        doctor = specialist(doctor_gender, specialty)
+        date = st.date_input("Select Date", min_value=now.date()).strftime("%Y-%m-%d")
+        time_str = st.time_input("Select Time", datetime.strptime("09:00", "%H:%M").time(),
+                                 step=timedelta(minutes=30)).strftime("%H:%M")
+    else:
+        date, time_str, doctor = slots[choice]
+    if st.button("Schedule Appointment"):
+        try:
+            scheduler.book(config.PATIENT_ID, doctor, specialty, date, time_str)
+        except SlotUnavailable as e:
+            slot_error(e)
+            return
+        st.success("New appointment scheduled!")
+        # The list and the sidebar's Next Appointment card both change
+        st.rerun()
 
 def reports():
     st.markdown("""
@@ -455,12 +1169,68 @@ def reports():
             """, unsafe_allow_html=True)
     with col2:
         st.markdown("<h2 class='section-header'>Generate Report</h2>", unsafe_allow_html=True)
-        report_type = st.selectbox("Report Type", ["Health Summary", "Medication History", "Vital Signs", "Lab Results"])
-        date_range = st.date_input("Date Range", [])
-        if st.button("Generate Report"):
-            st.info("Generating report... Please wait")
-            time.sleep(2)
-            st.success("Report generated successfully!")
+        report_generator([r for r in reports_list if r["type"] == "Laboratory"])
+
+@st.fragment
+def report_generator(lab_reports):
+    from report_engine import REPORT_TYPES
+    report_type = st.selectbox("Report Type", REPORT_TYPES)
+    date_range = st.date_input("Date Range", [])
+    start, end = report_period(config.PATIENT_ID, date_range)
+    st.caption(f"Covering {start} to {end}")
+    if st.button("Generate Report"):
+        medications, _ = get_medication_repo().list(config.PATIENT_ID)
+        appointments = get_appointment_repo().for_patient(config.PATIENT_ID)
+        context = {"appointments": appointments, "medications": medications, "lab_reports": lab_reports}
+        data_version = (get_metrics_store().version(config.PATIENT_ID), repr(appointments))
+        if report_type == "AI Health Narrative":
+            questions = [question for question, _, _ in chat_memory().turns]
+            context.update(narrator=get_narrator(), nutrition_questions=questions)
+            data_version += (repr(medications), tuple(questions))
+        st.session_state["report_job"] = get_report_engine().submit(
+            config.PATIENT_ID, report_type, start, end, data_version, context)
+        telemetry.cache_lookup("report", st.session_state["report_job"].cached)
+    job = st.session_state.get("report_job")
+    polling = job is not None and not job.done()
+    st.fragment(run_every=0.5 if polling else None)(report_status)(polling)
+
+def report_period(patient, date_range):
+    import numpy as np
+    if len(date_range) == 2:
+        return date_range[0], date_range[1]
+    bounds = get_metrics_store().bounds(patient)
+    end = np.datetime64(bounds[1], 's').astype('datetime64[D]').item() if bounds else datetime.now().date()
+    if len(date_range) == 1:
+        return date_range[0], end
+    return end - timedelta(days=29), end
+
+# Polls the background report job; re-runs on a timer only while it is building
+def report_status(polling):
+    job = st.session_state.get("report_job")
+    if job is None:
+        return
+    if not job.done():
+        st.progress(job.progress, text=f"Generating report... {job.message}")
+        report_sections(job)
+        return
+    if polling:
+        st.rerun()
+    try:
+        data = job.result()
+    except Exception as e:
+        st.error(f"Error generating report: {str(e)}")
+        return
+    st.success("Report ready (from cache)" if job.cached else "Report generated successfully!")
+    if None in job.sections.values():
+        st.warning("Some sections could not be written by Dr. Well and are left out of this report.")
+    report_sections(job)
+    st.download_button("Download PDF", data=data, file_name=job.filename, mime="application/pdf")
+
+# AI-written sections, shown as they arrive
+def report_sections(job):
+    for name, text in list(job.sections.items()):
+        with st.expander(name, expanded=not job.done()):
+            st.write(text if text is not None else "_This section could not be generated._")
 
 def settings():
     st.markdown("""
@@ -473,29 +1243,81 @@ def settings():
     tab1, tab2, tab3 = st.tabs(["Profile", "Notifications", "Privacy"])
     with tab1:
         st.markdown("<h2 class='section-header'>Profile Settings</h2>", unsafe_allow_html=True)
-        col1, col2 = st.columns(2)
-        with col1:
-            st.text_input("Full Name", "John Doe")
-            st.text_input("Email", "john.doe@email.com")
-            st.text_input("Phone", "+1 234 567 8900")
-        with col2:
-            st.date_input("Date of Birth")
-            st.selectbox("Blood Type", ["A+", "A-", "B+", "B-", "O+", "O-", "AB+", "AB-"])
-            st.text_area("Medical Conditions")
+        profile_settings()
     with tab2:
         st.markdown("<h2 class='section-header'>Notification Preferences</h2>", unsafe_allow_html=True)
-        st.checkbox("Email Notifications", value=True)
-        st.checkbox("SMS Notifications", value=True)
-        st.checkbox("Appointment Reminders", value=True)
-        st.checkbox("Medication Reminders", value=True)
-        st.checkbox("Health Tips", value=True)
+        notification_settings()
     with tab3:
         st.markdown("<h2 class='section-header'>Privacy Settings</h2>", unsafe_allow_html=True)
-        st.checkbox("Share health data with doctors", value=True)
-        st.checkbox("Allow anonymous data use for research", value=False)
-        st.checkbox("Enable two-factor authentication", value=True)
-        if st.button("Download My Data"):
-            st.success("Your data export has been initiated!")
+        privacy_settings()
+
+@st.fragment
+def profile_settings():
+    col1, col2 = st.columns(2)
+    with col1:
+        st.text_input("Full Name", "John Doe")
+        st.text_input("Email", "john.doe@email.com")
+        st.text_input("Phone", "+1 234 567 8900")
+    with col2:
+        st.date_input("Date of Birth")
+        st.selectbox("Blood Type", ["A+", "A-", "B+", "B-", "O+", "O-", "AB+", "AB-"])
+        st.text_area("Medical Conditions")
+
+@st.fragment
+def notification_settings():
+    st.checkbox("Email Notifications", value=True)
+    st.checkbox("SMS Notifications", value=True)
+    st.checkbox("Appointment Reminders", value=True)
+    st.checkbox("Medication Reminders", value=True)
+    st.checkbox("Health Tips", value=True)
+
+@st.fragment
+def privacy_settings():
+    st.checkbox("Share health data with doctors", value=True)
+    st.checkbox("Allow anonymous data use for research", value=False)
+    st.checkbox("Enable two-factor authentication", value=True)
+    st.download_button("Download My Data", data=data_export(config.PATIENT_ID),
+                       file_name=f"dr_well_data_{datetime.now():%Y-%m-%d}.zip",
+                       mime="application/zip", on_click="ignore")
+
+# The archive is only built when the button is clicked, on Streamlit's
+# download thread, so rendering Settings reads nothing and imports nothing;
+# only the session id is captured here. Chat history and medications are
+# small; metrics, appointments and reports are read incrementally while the
+# ZIP is written.
+def data_export(patient):
+    session_id = st.session_state.session_id
+
+    def build():
+        import hashlib
+        import json
+        from export import appointments_csv, bytes_member, json_member, metrics_csv
+        store, repo = get_metrics_store(), get_appointment_repo()
+        memory = get_conversations().get(session_id)
+        chat = {"summary": list(memory.summary),
+                "turns": [{"question": q, "answer": a} for q, a in memory.transcript]}
+        medications, _ = get_medication_repo().list(patient)
+        reports = {}
+        for (_, report_type, start, end, _), data in get_report_engine().cached(patient):
+            reports[f"reports/{report_type.lower().replace(' ', '_')}_{start}_{end}.pdf"] = data
+        small = json.dumps([chat, medications, sorted(reports)], sort_keys=True, default=str)
+        key = (str(patient), store.version(patient), repo.version(patient),
+               hashlib.sha256(small.encode("utf-8")).hexdigest(),
+               tuple(len(data) for _, data in sorted(reports.items())))
+
+        def members():
+            yield "metrics.csv", metrics_csv(store, patient)
+            yield "appointments.csv", appointments_csv(repo, patient)
+            yield "medications.json", json_member(medications)
+            yield "nutrition_chat.json", json_member(chat)
+            for name, data in sorted(reports.items()):
+                yield name, bytes_member(data)
+
+        # Streamlit's media file manager keeps the served download in memory,
+        # so the finished archive is handed over as bytes
+        with open(get_exporter().export(key, members), "rb") as f:
+            return f.read()
+    return build
 
 # Add CSS styles
 st.markdown("""
@@ -577,21 +1399,22 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Main content router
-if st.session_state.page == "Dashboard":
-    dashboard()
-elif st.session_state.page == "Consultations":
-    consultations()
-elif st.session_state.page == "Health Records":
-    health_records()
-elif st.session_state.page == "Nutrition":
-    nutrition()
-elif st.session_state.page == "Medications":
-    medications()
-elif st.session_state.page == "Appointments":
-    appointments()
-elif st.session_state.page == "Reports":
-    reports()
-elif st.session_state.page == "Settings":
-    settings()
-elif st.session_state.page == "About":
-    about()
+with telemetry.timed(telemetry.PAGE_RENDER_SECONDS, page=st.session_state.page):
+    if st.session_state.page == "Dashboard":
+        dashboard()
+    elif st.session_state.page == "Consultations":
+        consultations()
+    elif st.session_state.page == "Health Records":
+        health_records()
+    elif st.session_state.page == "Nutrition":
+        nutrition()
+    elif st.session_state.page == "Medications":
+        medications()
+    elif st.session_state.page == "Appointments":
+        appointments()
+    elif st.session_state.page == "Reports":
+        reports()
+    elif st.session_state.page == "Settings":
+        settings()
+    elif st.session_state.page == "About":
+        about()
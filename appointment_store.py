@@ -0,0 +1,262 @@
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+
+from shared_state import VersionConflict
+
+SCHEDULED = "Scheduled"
+CONFIRMED = "Confirmed"
+CANCELLED = "Cancelled"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient TEXT NOT NULL,
+    doctor TEXT NOT NULL,
+    specialty TEXT NOT NULL,
+    date TEXT NOT NULL,          -- YYYY-MM-DD
+    time TEXT NOT NULL,          -- HH:MM, 24-hour
+    status TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1   -- bumped by every update
+);
+CREATE INDEX IF NOT EXISTS appointments_patient_status ON appointments (patient, status, date, time);
+CREATE INDEX IF NOT EXISTS appointments_doctor_date ON appointments (doctor, date, time);
+CREATE INDEX IF NOT EXISTS appointments_patient_id ON appointments (patient, id);
+"""
+FIELDS = "id, patient, doctor, specialty, date, time, status, version"
+# No other active booking starts at the same doctor/date/time
+SLOT_FREE = ("NOT EXISTS (SELECT 1 FROM appointments WHERE doctor = ? AND date = ? AND time = ?"
+             f" AND status != '{CANCELLED}' AND id != ?)")
+# ORDER BY clauses for AppointmentRepository.page; "?" is bound to today
+ORDERS = {
+    "upcoming": "date < ?, CASE WHEN date >= ? THEN date || time END, date DESC, time DESC",
+    "newest": "date DESC, time DESC",
+    "oldest": "date, time",
+}
+
+
+@dataclass(frozen=True)
+class Appointment:
+    id: int
+    patient: str
+    doctor: str
+    specialty: str
+    date: str
+    time: str
+    status: str
+    version: int = 1
+
+    @property
+    def display_time(self):
+        return datetime.strptime(self.time, "%H:%M").strftime("%I:%M %p")
+
+
+class SlotTaken(Exception):
+    pass
+
+
+# Persistent appointment repository backed by SQLite. Queries go through the
+# (patient, status) and (doctor, date) indexes instead of scanning a list.
+# Several processes can share the file: updates that pass the version the
+# caller read fail with VersionConflict instead of overwriting a change made
+# elsewhere, and book()/reschedule() check the slot in the same statement.
+class AppointmentRepository:
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(appointments)")]
+        if columns and "version" not in columns:
+            self._db.execute("ALTER TABLE appointments ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    # `listener(appointment_id)` is called after every write to one appointment
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def _changed(self, appointment_id):
+        for listener in self._listeners:
+            listener(appointment_id)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [Appointment(*row) for row in rows]
+
+    def add(self, patient, doctor, specialty, date, time, status=SCHEDULED):
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO appointments (patient, doctor, specialty, date, time, status)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (str(patient), doctor, specialty, str(date), time, status),
+            )
+            self._db.commit()
+        self._changed(cursor.lastrowid)
+        return Appointment(cursor.lastrowid, str(patient), doctor, specialty, str(date), time, status)
+
+    # Like add(), but raises SlotTaken if the doctor already has an active
+    # booking starting at that date and time, even one made by another process
+    def book(self, patient, doctor, specialty, date, time, status=SCHEDULED):
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO appointments (patient, doctor, specialty, date, time, status)"
+                f" SELECT ?, ?, ?, ?, ?, ? WHERE {SLOT_FREE}",
+                (str(patient), doctor, specialty, str(date), time, status, doctor, str(date), time, 0),
+            )
+            self._db.commit()
+        if cursor.rowcount != 1:
+            raise SlotTaken(f"{doctor} is already booked at that time.")
+        self._changed(cursor.lastrowid)
+        return Appointment(cursor.lastrowid, str(patient), doctor, specialty, str(date), time, status)
+
+    # Bulk insert for imports and seeding; rows are dicts with the add() fields.
+    def add_many(self, patient, rows):
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO appointments (patient, doctor, specialty, date, time, status)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(str(patient), r["doctor"], r["specialty"], str(r["date"]), r["time"], r.get("status", SCHEDULED))
+                 for r in rows],
+            )
+            self._db.commit()
+
+    def get(self, appointment_id):
+        rows = self._query(f"SELECT {FIELDS} FROM appointments WHERE id = ?", (appointment_id,))
+        return rows[0] if rows else None
+
+    # Runs `sql` (an UPDATE that must bump the version) for one appointment,
+    # only if it is still at `version` when one is given. Returns False if
+    # the appointment doesn't exist or `condition` failed.
+    def _update(self, appointment_id, version, sql, params, condition="", condition_params=()):
+        where = " AND version = ?" if version is not None else ""
+        with self._lock:
+            updated = self._db.execute(
+                f"{sql} WHERE id = ?{where}{condition}",
+                (*params, appointment_id, *(() if version is None else (version,)), *condition_params),
+            ).rowcount
+            self._db.commit()
+        if updated == 1:
+            self._changed(appointment_id)
+            return True
+        current = self.get(appointment_id)
+        if current is not None and version is not None and current.version != version:
+            raise VersionConflict(f"appointment:{appointment_id}", version, current.version)
+        return False
+
+    def set_status(self, appointment_id, status, version=None):
+        return self._update(appointment_id, version,
+                            "UPDATE appointments SET status = ?, version = version + 1", (status,))
+
+    # Moves an appointment; it has to be confirmed again afterwards. Raises
+    # SlotTaken if the doctor has another active booking at the new time.
+    def reschedule(self, appointment_id, date, time, version=None):
+        current = self.get(appointment_id)
+        if current is None:
+            return False
+        moved = self._update(appointment_id, version,
+                             "UPDATE appointments SET date = ?, time = ?, status = ?, version = version + 1",
+                             (str(date), time, SCHEDULED), " AND " + SLOT_FREE,
+                             (current.doctor, str(date), time, appointment_id))
+        if not moved and self.get(appointment_id) is not None:
+            raise SlotTaken(f"{current.doctor} is already booked at that time.")
+        return moved
+
+    # Every booking that still holds its slot, across all patients
+    def active_since(self, date):
+        return self._query(
+            f"SELECT {FIELDS} FROM appointments WHERE date >= ? AND status != ? ORDER BY doctor, date, time",
+            (str(date), CANCELLED),
+        )
+
+    def count(self, patient):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM appointments WHERE patient = ?", (str(patient),)
+            ).fetchone()[0]
+
+    # Changes whenever one of the patient's appointments is added or updated
+    # (by any process), so derived data (exports, reports) can be keyed on it
+    def version(self, patient):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(version), 0) FROM appointments WHERE patient = ?", (str(patient),)
+            ).fetchone()
+
+    # A patient's appointments `batch` rows at a time (keyset pagination on
+    # id), so exports never hold the full history
+    def iter_patient(self, patient, batch=1000):
+        last = 0
+        while True:
+            rows = self._query(
+                f"SELECT {FIELDS} FROM appointments WHERE patient = ? AND id > ? ORDER BY id LIMIT ?",
+                (str(patient), last, batch),
+            )
+            yield from rows
+            if len(rows) < batch:
+                return
+            last = rows[-1].id
+
+    def for_patient(self, patient):
+        return self._query(
+            f"SELECT {FIELDS} FROM appointments WHERE patient = ? ORDER BY date, time", (str(patient),)
+        )
+
+    def confirmed(self, patient):
+        return self._query(
+            f"SELECT {FIELDS} FROM appointments WHERE patient = ? AND status = ? ORDER BY date, time",
+            (str(patient), CONFIRMED),
+        )
+
+    def upcoming(self, patient, today, limit=None):
+        sql = (
+            f"SELECT {FIELDS} FROM appointments"
+            " WHERE patient = ? AND status IN (?, ?) AND date >= ? ORDER BY date, time"
+        )
+        params = [str(patient), SCHEDULED, CONFIRMED, str(today)]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._query(sql, params)
+
+    # One page of a patient's appointments plus the total number matching,
+    # filtered and sorted in SQL so only `limit` rows leave the database.
+    # `order` is one of ORDERS; "upcoming" lists appointments from `today`
+    # onwards soonest first, followed by past ones most recent first.
+    def page(self, patient, today, statuses=(), doctor="", include_past=True, order="upcoming",
+             limit=10, offset=0):
+        if order not in ORDERS:
+            raise ValueError(f"Unknown appointment order: {order}")
+        where = ["patient = ?"]
+        params = [str(patient)]
+        if statuses:
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if doctor.strip():
+            escaped = doctor.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("doctor LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if not include_past:
+            where.append("date >= ?")
+            params.append(str(today))
+        where = " AND ".join(where)
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM appointments WHERE {where}", params).fetchone()[0]
+            order_params = [str(today)] * ORDERS[order].count("?")
+            rows = self._db.execute(
+                f"SELECT {FIELDS} FROM appointments WHERE {where} ORDER BY {ORDERS[order]} LIMIT ? OFFSET ?",
+                params + order_params + [limit, offset],
+            ).fetchall()
+        return [Appointment(*row) for row in rows], total
+
+    def by_doctor(self, doctor, date=None):
+        if date is None:
+            return self._query(
+                f"SELECT {FIELDS} FROM appointments WHERE doctor = ? ORDER BY date, time", (doctor,)
+            )
+        return self._query(
+            f"SELECT {FIELDS} FROM appointments WHERE doctor = ? AND date = ? ORDER BY time",
+            (doctor, str(date)),
+        )
@@ -0,0 +1,106 @@
+"""Cold-start benchmark for app.py.
+
+Every measurement runs in a fresh Python process, the way a new replica would:
+the page is selected with ?page=<name>, the script is executed once through
+Streamlit's AppTest harness, and `-X importtime` attributes module import time
+to that first render.
+
+    python benchmarks/cold_start.py                  # all pages, 3 runs each
+    python benchmarks/cold_start.py --pages Dashboard Nutrition --runs 5
+    python benchmarks/cold_start.py --json cold_start.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+PAGES = ["Dashboard", "Consultations", "Nutrition", "Medications", "Appointments", "Reports", "Settings", "About"]
+MARKER = "@@first-render"
+
+RUNNER = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.query_params["page"] = {page!r}
+sys.stderr.write({marker!r} + "\\n")
+sys.stderr.flush()
+started = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - started
+print(json.dumps({{"render_s": elapsed, "exceptions": [str(e.value) for e in at.exception]}}))
+"""
+
+
+def parse_importtime(stderr):
+    # Lines look like "import time:  self [us] | cumulative | package"; only
+    # imports that happen after the marker belong to the page render.
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1:]
+    total_us = 0
+    top_level = {}
+    for line in lines:
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        total_us += int(self_us)
+        package = name.split(".")[0]
+        top_level[package] = top_level.get(package, 0) + int(self_us)
+    return total_us / 1e6, top_level
+
+
+def run_page(page, env):
+    code = RUNNER.format(app=APP, page=page, marker=MARKER)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, env=env, cwd=ROOT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{page}: benchmark process failed\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["import_s"], result["modules"] = parse_importtime(proc.stderr)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="heaviest packages to list per page")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "benchmark")
+    env["DRWELL_DATA_DIR"] = tempfile.mkdtemp(prefix="drwell-bench-")
+    # Seed the data directory once so runs measure a replica with existing data.
+    for page in args.pages:
+        run_page(page, env)
+
+    results = {}
+    print(f"{'page':<15}{'import ms':>12}{'render ms':>12}  heaviest imports")
+    for page in args.pages:
+        runs = [run_page(page, env) for _ in range(args.runs)]
+        modules = runs[-1]["modules"]
+        heaviest = sorted(modules.items(), key=lambda kv: -kv[1])[:args.top]
+        results[page] = {
+            "import_ms": statistics.median(r["import_s"] for r in runs) * 1000,
+            "render_ms": statistics.median(r["render_s"] for r in runs) * 1000,
+            "imported_packages": sorted(modules),
+            "exceptions": runs[-1]["exceptions"],
+        }
+        listing = ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in heaviest)
+        print(f"{page:<15}{results[page]['import_ms']:>12.1f}{results[page]['render_ms']:>12.1f}  {listing}")
+        for error in runs[-1]["exceptions"]:
+            print(f"{'':<15}! {error}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Local stand-in for the Groq chat completions API.
+
+Serves POST /openai/v1/chat/completions with canned Dr. Well answers, both as
+a single JSON body and as a server-sent event stream, after a configurable
+delay. Point the app at it with GROQ_BASE_URL:
+
+    python benchmarks/groq_stub.py --port 8787 --latency 0.4 --chunk-delay 0.02
+    GROQ_BASE_URL=http://127.0.0.1:8787 GROQ_API_KEY=stub streamlit run app.py
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = (
+    "Hello, I'm Dr. Well. A balanced plate is half vegetables, a quarter lean protein "
+    "and a quarter whole grains. Stay hydrated, keep added sugar low and aim for "
+    "regular meals. Please consult your physician before major dietary changes."
+)
+
+
+class StubGroqServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.3, chunk_delay=0.01, chunk_words=3, answer=ANSWER):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_words = chunk_words
+        self.answer = answer
+        self.requests = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def chunks(self):
+        words = self.answer.split(" ")
+        for i in range(0, len(words), self.chunk_words):
+            yield " ".join(words[i:i + self.chunk_words]) + " "
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub.requests += 1
+                time.sleep(stub.latency)
+                if body.get("stream"):
+                    self._stream(body)
+                else:
+                    self._complete(body)
+
+            def _usage(self, body):
+                prompt = sum(len(m.get("content", "")) // 4 for m in body.get("messages", []))
+                completion = len(stub.answer) // 4
+                return {"prompt_tokens": prompt, "completion_tokens": completion,
+                        "total_tokens": prompt + completion}
+
+            def _complete(self, body):
+                payload = json.dumps({
+                    "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion",
+                    "created": int(time.time()), "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": stub.answer}}],
+                    "usage": self._usage(body),
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion.chunk",
+                        "created": int(time.time()), "model": body.get("model", "stub")}
+                for text in stub.chunks():
+                    chunk = dict(base, choices=[{"index": 0, "delta": {"content": text}, "finish_reason": None}])
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(stub.chunk_delay)
+                final = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                             x_groq={"usage": self._usage(body)})
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+                self.wfile.flush()
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first byte")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="seconds between streamed chunks")
+    args = parser.parse_args(argv)
+    server = StubGroqServer(args.host, args.port, args.latency, args.chunk_delay)
+    print(f"Groq stand-in listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
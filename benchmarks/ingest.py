@@ -0,0 +1,117 @@
+"""Wearable import check and throughput benchmark for ingest.py.
+
+Writes the same per-minute readings as a CSV, an NDJSON and a JSON-array
+export, imports each through ingest.Ingestor into a fresh MetricsStore and
+checks that the job finished without error and that every reading was
+stored. A final run imports the readings as one file per metric (the way
+most wearables export them) and checks that no import blanks the metrics
+of an earlier one.
+
+    python benchmarks/ingest.py                      # 260k rows per format
+    python benchmarks/ingest.py --rows 2000000 --formats csv json
+
+Exits non-zero if any check fails.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ingest import Ingestor  # noqa: E402
+from metrics_store import COLUMNS, TIMESTAMP, MetricsStore  # noqa: E402
+
+FORMATS = ["csv", "ndjson", "json"]
+START = 1_700_000_000
+
+
+def readings(rows):
+    rng = np.random.default_rng(7)
+    return {
+        "Heart Rate": rng.integers(50, 120, rows).astype(np.float32),
+        "Blood Pressure": rng.integers(100, 150, rows).astype(np.float32),
+        "Sleep Hours": np.round(rng.uniform(5, 9, rows), 1).astype(np.float32),
+        "Steps": rng.integers(0, 200, rows).astype(np.float32),
+    }
+
+
+def write_export(path, fmt, ts, values):
+    names = list(values)
+    columns = [ts.tolist()] + [values[n].tolist() for n in names]
+    with open(path, "w") as f:
+        if fmt == "csv":
+            f.write(",".join(["timestamp"] + names) + "\n")
+            for row in zip(*columns):
+                f.write(",".join(map(str, row)) + "\n")
+        elif fmt == "ndjson":
+            for row in zip(*columns):
+                f.write(json.dumps(dict(zip(["timestamp"] + names, row))) + "\n")
+        else:
+            f.write("[")
+            for i, row in enumerate(zip(*columns)):
+                f.write(("," if i else "") + json.dumps(dict(zip(["timestamp"] + names, row))))
+            f.write("]")
+
+
+def run_import(ingestor, patient, path, fmt):
+    started = time.perf_counter()
+    job = ingestor.submit(patient, path, fmt=fmt)
+    job.future.exception()
+    return job, time.perf_counter() - started
+
+
+def check_stored(store, patient, ts, values):
+    stored = store.read(patient)
+    failures = []
+    if len(stored[TIMESTAMP]) != len(ts):
+        failures.append(f"stored {len(stored[TIMESTAMP]):,} rows, expected {len(ts):,}")
+        return failures
+    for name, expected in values.items():
+        if not np.array_equal(np.asarray(stored[name]), expected):
+            missing = int(np.isnan(np.asarray(stored[name])).sum())
+            failures.append(f"{name} differs from the export ({missing:,} missing)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # Not a multiple of ingest.CHUNK_ROWS, so every import ends on a partial chunk
+    parser.add_argument("--rows", type=int, default=260_000)
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS)
+    args = parser.parse_args(argv)
+
+    ts = START + 60 * np.arange(args.rows, dtype=np.int64)
+    values = readings(args.rows)
+    root = tempfile.mkdtemp(prefix="drwell-ingest-")
+    failed = False
+
+    print(f"{'import':<22}{'rows/s':>12}{'seconds':>10}  result")
+    runs = [(fmt, fmt, [list(COLUMNS)]) for fmt in args.formats]
+    runs.append(("per-metric csv", "csv", [[name] for name in COLUMNS]))
+    for label, fmt, files in runs:
+        store = MetricsStore(os.path.join(root, label.replace(" ", "-")))
+        ingestor = Ingestor(store)
+        elapsed, failures = 0.0, []
+        for i, names in enumerate(files):
+            path = os.path.join(root, f"export-{i}.{fmt}")
+            write_export(path, fmt, ts, {n: values[n] for n in names})
+            job, seconds = run_import(ingestor, "bench", path, fmt)
+            elapsed += seconds
+            if job.error() is not None:
+                failures.append(f"job failed: {job.error()!r}")
+        if not failures:
+            failures = check_stored(store, "bench", ts, values)
+        failed |= bool(failures)
+        result = "; ".join(failures) or "ok"
+        print(f"{label:<22}{args.rows * len(files) / elapsed:>12,.0f}{elapsed:>10.2f}  {result}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Headless render benchmark for every routed page of app.py.
+
+Each data scale runs in its own worker process with a freshly seeded
+DRWELL_DATA_DIR, so Streamlit's resource caches never leak between scales.
+Pages are driven through streamlit.testing.v1.AppTest (?page=<name>), and
+the Nutrition chat is exercised against the local Groq stand-in in
+benchmarks/groq_stub.py.
+
+Per page and scale it records p50/p95 render time, peak Python memory
+(tracemalloc) and payload size (serialized element protos sent to the
+browser), writes everything to a JSON file and optionally compares it with a
+stored baseline:
+
+    python benchmarks/pages.py --out bench.json
+    python benchmarks/pages.py --scales small --runs 10 --baseline benchmarks/baseline.json
+    python benchmarks/pages.py --update-baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+PAGES = ["Dashboard", "Consultations", "Nutrition", "Medications", "Appointments", "Reports", "Settings", "About"]
+# name: (days of per-minute metrics, number of appointments)
+SCALES = {
+    "small": (30, 10),
+    "medium": (365, 1000),
+    "large": (5 * 365, 10000),
+}
+# Allowed relative growth before a metric counts as a regression
+THRESHOLDS = {"p50_ms": 0.20, "p95_ms": 0.30, "peak_kb": 0.25, "payload_kb": 0.10}
+
+
+# --- data seeding (worker) -------------------------------------------------
+def seed(days, n_appointments, patient):
+    import numpy as np
+    from appointment_store import AppointmentRepository, CONFIRMED, SCHEDULED
+    from metrics_store import MetricsStore
+    import config
+
+    rng = np.random.default_rng(42)
+    store = MetricsStore(os.path.join(config.DATA_DIR, "metrics"))
+    end = np.datetime64("now", "m")
+    start = end - np.timedelta64(days * 24 * 60, "m")
+    # One month at a time keeps seeding memory flat at the 5-year scale
+    cursor = start
+    while cursor < end:
+        stop = min(cursor + np.timedelta64(31 * 24 * 60, "m"), end)
+        ts = np.arange(cursor, stop, np.timedelta64(1, "m"))
+        n = len(ts)
+        minute = (ts - ts.astype("datetime64[D]")).astype(np.int64)
+        store.append(patient, ts, {
+            "Heart Rate": rng.normal(72, 8, n),
+            "Blood Pressure": rng.normal(120, 10, n),
+            "Sleep Hours": np.where(minute == 0, rng.normal(7.2, 0.8, n), np.nan),
+            "Steps": rng.poisson(6, n),
+        })
+        cursor = stop
+
+    repo = AppointmentRepository(config.data_path("appointments.sqlite3"))
+    today = np.datetime64("today", "D")
+    offsets = rng.integers(-365, 365, n_appointments)
+    specialties = ["Cardiology", "Dermatology", "Neurology", "Orthopedics", "General Medicine"]
+    repo.add_many(patient, [{
+        "doctor": f"Dr. {'Male' if i % 2 else 'Female'} {specialties[i % 5]} Specialist",
+        "specialty": specialties[i % 5],
+        "date": str(today + int(offsets[i])),
+        "time": f"{9 + i % 8:02d}:{(i * 15) % 60:02d}",
+        "status": CONFIRMED if i % 3 == 0 else SCHEDULED,
+    } for i in range(n_appointments)])
+
+
+# --- measurement (worker) --------------------------------------------------
+def payload_bytes(node):
+    size = 0
+    proto = getattr(node, "proto", None)
+    if proto is not None and hasattr(proto, "ByteSize"):
+        size += proto.ByteSize()
+    children = getattr(node, "children", None)
+    if isinstance(children, dict):
+        size += sum(payload_bytes(child) for child in children.values())
+    return size
+
+
+def render(page, interact=None):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP, default_timeout=300)
+    at.query_params["page"] = page
+    started = time.perf_counter()
+    at.run()
+    if interact:
+        interact(at)
+    elapsed = time.perf_counter() - started
+    errors = [str(e.value) for e in at.exception]
+    return at, elapsed, errors
+
+
+def ask_dr_well(counter=[0]):
+    # A unique question per run so the response cache never answers it
+    def interact(at):
+        counter[0] += 1
+        at.text_input[0].set_value(f"Benchmark question {counter[0]} {time.time()}").run()
+        next(b for b in at.button if b.label == "Ask Dr. Well").click().run()
+    return interact
+
+
+def measure(page, runs, interact=None):
+    render(page, interact)  # warm caches and imports
+    times, errors = [], []
+    for _ in range(runs):
+        at, elapsed, errs = render(page, interact)
+        times.append(elapsed * 1000)
+        errors.extend(errs)
+    tracemalloc.start()
+    at, _, _ = render(page, interact)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times.sort()
+    result = {
+        "p50_ms": statistics.median(times),
+        "p95_ms": times[min(len(times) - 1, int(round(0.95 * (len(times) - 1))))],
+        "peak_kb": peak / 1024,
+        "payload_kb": payload_bytes(at._tree) / 1024,
+        "errors": sorted(set(errors)),
+    }
+    if interact:
+        latency = at.session_state["ai_latency"][-1] if "ai_latency" in at.session_state else {}
+        result["ttft_ms"] = (latency.get("ttft") or 0) * 1000
+    return result
+
+
+def worker(scale, runs, pages):
+    import config
+    days, n_appointments = SCALES[scale]
+    seed(days, n_appointments, config.PATIENT_ID)
+    results = {}
+    for page in pages:
+        results[page] = measure(page, runs)
+    if "Nutrition" in pages:
+        results["Nutrition (ask)"] = measure("Nutrition", runs, ask_dr_well())
+    print(json.dumps(results))
+
+
+# --- driver ------------------------------------------------------------------
+def run_scale(scale, runs, pages, stub_url):
+    env = dict(os.environ)
+    env.update(DRWELL_DATA_DIR=tempfile.mkdtemp(prefix=f"drwell-{scale}-"),
+               GROQ_BASE_URL=stub_url, GROQ_API_KEY="benchmark",
+               GROQ_REQUESTS_PER_MINUTE="100000", GROQ_TOKENS_PER_MINUTE="100000000")
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", scale, "--runs", str(runs), "--pages", *pages]
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env, cwd=ROOT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{scale}: worker failed\n{proc.stderr[-3000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline):
+    regressions = []
+    for scale, pages in results.items():
+        for page, metrics in pages.items():
+            base = baseline.get(scale, {}).get(page)
+            if not base:
+                continue
+            for key, allowed in THRESHOLDS.items():
+                if base.get(key) and metrics[key] > base[key] * (1 + allowed):
+                    regressions.append(f"{scale}/{page}: {key} {base[key]:.1f} -> {metrics[key]:.1f} "
+                                       f"(+{metrics[key] / base[key] - 1:.0%}, limit +{allowed:.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", default=list(SCALES), choices=list(SCALES))
+    parser.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.3, help="stub Groq time to first byte (s)")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="stub Groq delay between chunks (s)")
+    parser.add_argument("--out", default="bench_pages.json")
+    parser.add_argument("--baseline", help="fail if results regress past THRESHOLDS against this file")
+    parser.add_argument("--update-baseline", metavar="PATH", help="write results as the new baseline")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker(args.worker, args.runs, args.pages)
+        return 0
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from groq_stub import StubGroqServer
+    stub = StubGroqServer(latency=args.latency, chunk_delay=args.chunk_delay).start()
+    results = {}
+    try:
+        for scale in args.scales:
+            results[scale] = run_scale(scale, args.runs, args.pages, stub.base_url)
+            print(f"\n[{scale}] {SCALES[scale][0]} days of metrics, {SCALES[scale][1]} appointments")
+            print(f"{'page':<18}{'p50 ms':>10}{'p95 ms':>10}{'peak KB':>10}{'payload KB':>12}")
+            for page, m in results[scale].items():
+                print(f"{page:<18}{m['p50_ms']:>10.1f}{m['p95_ms']:>10.1f}{m['peak_kb']:>10.0f}{m['payload_kb']:>12.1f}"
+                      + (f"  ! {m['errors'][0]}" if m["errors"] else ""))
+    finally:
+        stub.stop()
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.update_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
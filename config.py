@@ -0,0 +1,48 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared settings for the Dr. Well modules. Everything can be overridden
+# through environment variables or a .env file.
+DATA_DIR = os.getenv("DRWELL_DATA_DIR", ".drwell")
+PATIENT_ID = os.getenv("DRWELL_PATIENT_ID", "12345")
+
+RESPONSE_CACHE_TTL = int(os.getenv("DRWELL_RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+RESPONSE_CACHE_SIZE = int(os.getenv("DRWELL_RESPONSE_CACHE_SIZE", "256"))
+# Minimum Jaccard similarity for answering a free-text question from a
+# previously answered one; set above 1 to disable the semantic cache.
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("DRWELL_SEMANTIC_CACHE_THRESHOLD", "0.75"))
+
+# Nutrition chat history sent with each question, and how long an idle
+# session's history is kept in memory
+CHAT_MEMORY_TOKENS = int(os.getenv("DRWELL_CHAT_MEMORY_TOKENS", "1200"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("DRWELL_CHAT_SUMMARY_TOKENS", "300"))
+CHAT_IDLE_SECONDS = int(os.getenv("DRWELL_CHAT_IDLE_SECONDS", "1800"))
+
+# State shared between app.py replicas (medication lists, change
+# notifications): "sqlite:///<path>" for processes on one host (default:
+# state.sqlite3 in DATA_DIR) or "redis://host:6379/0" across hosts. Each
+# process checks for other replicas' changes at most every poll interval.
+STATE_URL = os.getenv("DRWELL_STATE_URL", "")
+STATE_POLL_SECONDS = float(os.getenv("DRWELL_STATE_POLL_SECONDS", "0.5"))
+
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "4"))
+GROQ_POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", "20"))
+
+# "AI Health Narrative" reports: sections requested from Groq at once, and
+# how long one section may take before the report goes out without it
+REPORT_AI_CONCURRENCY = int(os.getenv("DRWELL_REPORT_AI_CONCURRENCY", "4"))
+REPORT_AI_SECTION_TIMEOUT = float(os.getenv("DRWELL_REPORT_AI_SECTION_TIMEOUT", "30"))
+
+METRICS_PORT = os.getenv("DRWELL_METRICS_PORT", "9464")
+METRICS_JSONL = os.getenv("DRWELL_METRICS_JSONL", "")
+
+
+def data_path(*parts):
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
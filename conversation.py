@@ -0,0 +1,127 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from tokens import estimate_tokens
+
+# Per-session chat memory with a hard token budget. History is sent as
+#   [system prompt] [summary of older turns] [recent turns...] [new question]
+# and only ever grows at the end until the budget is hit. Then the oldest
+# turns are folded into the summary in one go, down to half of what the
+# summary leaves free, so the prefix changes once per compaction instead of
+# on every turn and upstream prompt caching keeps matching it. The latest
+# exchange is never folded (only trimmed if it alone overflows the budget),
+# so follow-up questions always see it verbatim. The summary is built
+# locally (first sentences of each exchange), so compaction costs no extra
+# request. `transcript` keeps the exchanges as asked and answered, for
+# display, independent of what is sent.
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_GREETING = re.compile(r"^(hello|hi|hey)\b.*?dr\.? well\b[^.!?]*[.!?]\s*", re.IGNORECASE)
+
+
+def _clip(text, limit):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def _gist(answer, sentences=2, limit=240):
+    answer = _GREETING.sub("", " ".join(answer.split()), count=1)
+    return _clip(" ".join(_SENTENCE.split(answer)[:sentences]), limit)
+
+
+class ConversationMemory:
+    def __init__(self, budget=1200, summary_budget=300, transcript_size=100):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.transcript_size = transcript_size
+        self.summary = []      # one line per folded exchange
+        self.turns = []        # (question, answer, tokens)
+        self.transcript = []   # (question, answer), most recent last
+        self.compactions = 0
+
+    def messages(self):
+        messages = []
+        if self.summary:
+            messages.append({"role": "system",
+                             "content": "Summary of the earlier conversation:\n" + "\n".join(self.summary)})
+        for question, answer, _ in self.turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+
+    def tokens(self):
+        return estimate_tokens(self.messages())
+
+    def add(self, question, answer):
+        cost = estimate_tokens([{"content": question}, {"content": answer}])
+        self.turns.append((question, answer, cost))
+        self.transcript.append((question, answer))
+        del self.transcript[:-self.transcript_size]
+        if self.tokens() > self.budget:
+            self._compact()
+
+    def clear(self):
+        self.summary = []
+        self.turns = []
+        self.transcript = []
+
+    def _compact(self):
+        target = (self.budget - self.summary_budget) // 2
+        recent = sum(t[2] for t in self.turns)
+        while len(self.turns) > 1 and recent > target:
+            question, answer, cost = self.turns.pop(0)
+            recent -= cost
+            self.summary.append(f"- Patient asked: {_clip(question, 160)} Dr. Well: {_gist(answer)}")
+        # The latest exchange stays, cut down to what the summary leaves free
+        question, answer, cost = self.turns[-1]
+        room = self.budget - self.summary_budget
+        if cost > room:
+            question = _clip(question, room)
+            answer = _clip(answer, max(4 * (room - 8) - len(question), 200))
+            self.turns[-1] = (question, answer, estimate_tokens([{"content": question}, {"content": answer}]))
+        # Oldest summary lines go first once the summary outgrows its share
+        while self.summary and estimate_tokens([{"content": "\n".join(self.summary)}]) > self.summary_budget:
+            self.summary.pop(0)
+        self.compactions += 1
+
+
+# Memories keyed by session id, most recently used last. Sessions idle for
+# `idle_seconds`, and the least recently used ones beyond `max_sessions`,
+# are dropped whenever another session is looked up.
+class ConversationStore:
+    def __init__(self, budget=1200, summary_budget=300, idle_seconds=1800, max_sessions=500):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.evicted = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            memory = entry[0] if entry else ConversationMemory(self.budget, self.summary_budget)
+            self._sessions[session_id] = (memory, now)
+            self._evict(now)
+        return memory
+
+    def _evict(self, now):
+        while self._sessions:
+            _, (_, last_used) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - last_used < self.idle_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def stats(self):
+        with self._lock:
+            memories = [memory for memory, _ in self._sessions.values()]
+        return {
+            "sessions": len(memories),
+            "tokens": sum(memory.tokens() for memory in memories),
+            "evicted": self.evicted,
+        }
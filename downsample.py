@@ -0,0 +1,30 @@
+import numpy as np
+
+
+# Largest-Triangle-Three-Buckets (Steinarsson, 2013). Returns the indices of
+# `threshold` points that preserve the visual shape of (x, y): the first and
+# last points are always kept, and from each bucket in between the point
+# forming the largest triangle with the previously kept point and the mean
+# of the next bucket is chosen. NaN samples are skipped.
+def lttb_indices(x, y, threshold):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if threshold >= n or threshold < 3:
+        return valid
+    xs, ys = x[valid], y[valid]
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xs[next_lo:next_hi].mean() if next_hi > next_lo else xs[-1]
+        avg_y = ys[next_lo:next_hi].mean() if next_hi > next_lo else ys[-1]
+        area = np.abs((xs[a] - avg_x) * (ys[lo:hi] - ys[a]) - (xs[a] - xs[lo:hi]) * (avg_y - ys[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return valid[keep]
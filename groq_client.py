@@ -0,0 +1,223 @@
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+from groq import AsyncGroq, Groq
+
+from tokens import estimate_tokens
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError"}
+
+
+# Classic token bucket: `capacity` tokens refilled continuously at
+# capacity / period per second.
+class TokenBucket:
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+# A pending acquire() that its caller may give up on (see RateLimiter.cancel)
+class Reservation:
+    def __init__(self):
+        self.cancelled = False
+        self.granted = False
+
+
+# Process-wide limiter shared by every session: one bucket for requests per
+# minute and one for tokens per minute. Callers block in FIFO order until
+# both buckets can cover the request. An acquire with a Reservation can be
+# cancelled from another thread: it then leaves the queue when its turn
+# comes without taking anything, or hands back what it already took.
+class RateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self, tokens, reservation=None):
+        started = time.monotonic()
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            try:
+                while True:
+                    if ticket == self._serving:
+                        if reservation is not None and reservation.cancelled:
+                            return None
+                        now = time.monotonic()
+                        self.requests.refill(now)
+                        self.tokens.refill(now)
+                        delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                        if delay <= 0:
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+                self.requests.tokens -= 1
+                self.tokens.tokens -= min(tokens, self.tokens.capacity)
+                if reservation is not None:
+                    reservation.granted = True
+            finally:
+                self._serving = max(self._serving, ticket + 1)
+                self.queue_depth -= 1
+                self._cond.notify_all()
+            waited = time.monotonic() - started
+            self.acquired += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def cancel(self, reservation, tokens):
+        with self._cond:
+            reservation.cancelled = True
+            if reservation.granted:
+                reservation.granted = False
+                self.requests.tokens = min(self.requests.capacity, self.requests.tokens + 1)
+                self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + min(tokens, self.tokens.capacity))
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "acquired": self.acquired,
+                "avg_wait": self.total_wait / self.acquired if self.acquired else 0.0,
+                "max_wait": self.max_wait,
+                "requests_available": self.requests.tokens,
+                "tokens_available": self.tokens.tokens,
+            }
+
+
+def is_retryable(error):
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS
+
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# One Groq client per server process, sharing a pooled HTTP connection and a
+# rate limiter across all sessions. Retryable errors (429, 5xx, connection
+# failures) are retried with full-jitter exponential backoff.
+#
+# acreate() is the asyncio counterpart for fanning out many requests at
+# once. Its AsyncGroq client and connection pool belong to one event loop
+# that the gateway runs on a daemon thread, started on first use; other
+# threads schedule coroutines there with run_async(). Both paths draw from
+# the same rate limiter.
+class GroqGateway:
+    def __init__(self, api_key, requests_per_minute=30, tokens_per_minute=6000,
+                 max_retries=4, backoff_base=0.5, backoff_cap=20.0, pool_size=20, timeout=60.0):
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=timeout,
+        )
+        self.client = Groq(api_key=api_key, http_client=self.http_client, max_retries=0)
+        self.async_client = AsyncGroq(
+            api_key=api_key, max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                timeout=timeout,
+            ),
+        )
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retries = 0
+        self.failures = 0
+
+    def create(self, messages, max_tokens=1024, **kwargs):
+        budget = estimate_tokens(messages) + max_tokens
+        attempt = 0
+        while True:
+            self.limiter.acquire(budget)
+            try:
+                return self.client.chat.completions.create(messages=messages, max_tokens=max_tokens, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.failures += 1
+                    raise
+                delay = retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                time.sleep(delay)
+
+    async def acreate(self, messages, max_tokens=1024, **kwargs):
+        budget = estimate_tokens(messages) + max_tokens
+        attempt = 0
+        while True:
+            # The limiter blocks, so it waits on a worker thread, not the loop.
+            # That thread is not stopped by cancelling this coroutine (e.g. a
+            # section timeout), so the wait is cancelled in the limiter too.
+            reservation = Reservation()
+            try:
+                await asyncio.to_thread(self.limiter.acquire, budget, reservation)
+            except asyncio.CancelledError:
+                self.limiter.cancel(reservation, budget)
+                raise
+            try:
+                return await self.async_client.chat.completions.create(
+                    messages=messages, max_tokens=max_tokens, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self.failures += 1
+                    raise
+                delay = retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+    # Schedules `coro` on the gateway's event loop; returns a
+    # concurrent.futures.Future
+    def run_async(self, coro):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="groq-async", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def stats(self):
+        stats = self.limiter.stats()
+        stats.update(retries=self.retries, failures=self.failures)
+        return stats
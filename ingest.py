@@ -0,0 +1,221 @@
+import io
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from metrics_store import COLUMNS, dedupe_last
+
+# Bulk import of wearable exports (CSV, NDJSON or a JSON array of records)
+# into the MetricsStore. Files are read in fixed-size chunks on a background
+# thread, so memory stays bounded by `chunk_rows` whatever the file size and
+# the Streamlit script thread never waits on a parse.
+
+CHUNK_ROWS = 100_000
+TIMESTAMP_NAMES = ("timestamp", "datetime", "date_time", "time", "date", "ts")
+# Normalized header -> metric column
+ALIASES = {
+    "heart_rate": "Heart Rate", "heartrate": "Heart Rate", "hr": "Heart Rate", "bpm": "Heart Rate",
+    "blood_pressure": "Blood Pressure", "bp": "Blood Pressure", "systolic": "Blood Pressure",
+    "sleep_hours": "Sleep Hours", "sleep": "Sleep Hours", "hours_slept": "Sleep Hours",
+    "steps": "Steps", "step_count": "Steps", "daily_steps": "Steps",
+}
+# Plausible ranges; readings outside them are dropped as sensor noise
+VALID_RANGES = {
+    "Heart Rate": (20, 250),
+    "Blood Pressure": (50, 260),
+    "Sleep Hours": (0, 24),
+    "Steps": (0, 100_000),
+}
+
+
+def normalize_header(name):
+    return re.sub(r"[^a-z0-9]+", "_", str(name).strip().lower()).strip("_")
+
+
+# Yields the records of a top-level JSON array without loading the file:
+# the buffer only ever holds the unparsed tail plus one read of `bufsize`.
+def iter_json_array(f, bufsize=1 << 20):
+    decoder = json.JSONDecoder()
+    buffer, pos, started = "", 0, False
+    while True:
+        chunk = f.read(bufsize)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if not started and pos < len(buffer):
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array of records")
+                started, pos = True, pos + 1
+                continue
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if not chunk:
+                    raise ValueError("Truncated JSON array") from None
+                break
+            yield record
+            pos = end
+        if not chunk:
+            return
+
+
+def _batched(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield pd.DataFrame.from_records(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch)
+
+
+def sniff_format(path):
+    with open(path, "rb") as f:
+        head = f.read(4096).lstrip()
+    if head.startswith(b"["):
+        return "json"
+    if head.startswith(b"{"):
+        return "ndjson"
+    return "csv"
+
+
+# DataFrames of at most `chunk_rows` rows from an open binary file
+def read_chunks(f, fmt, chunk_rows=CHUNK_ROWS):
+    if fmt == "csv":
+        return pd.read_csv(f, chunksize=chunk_rows, low_memory=True)
+    if fmt == "ndjson":
+        return pd.read_json(f, lines=True, chunksize=chunk_rows, convert_dates=False, dtype=False)
+    if fmt == "json":
+        return _json_chunks(f, chunk_rows)
+    raise ValueError(f"Unknown file format: {fmt}")
+
+
+# The text wrapper is detached rather than dropped when reading ends:
+# dropping it would close `f`, which the caller still reads progress from.
+def _json_chunks(f, chunk_rows):
+    text = io.TextIOWrapper(f, encoding="utf-8")
+    try:
+        yield from _batched(iter_json_array(text), chunk_rows)
+    finally:
+        text.detach()
+
+
+# ISO strings (any offset is converted to UTC) or Unix epochs in seconds or
+# milliseconds; unparseable values become NaT
+def parse_timestamps(column):
+    if pd.api.types.is_numeric_dtype(column):
+        unit = "ms" if column.abs().max() > 1e11 else "s"
+        ts = pd.to_datetime(column, unit=unit, errors="coerce", utc=True)
+    else:
+        ts = pd.to_datetime(column, errors="coerce", utc=True)
+    return ts.dt.tz_localize(None).to_numpy(dtype="datetime64[s]")
+
+
+# Maps one raw chunk onto the store's schema: UTC-naive int64 timestamps and
+# float32 metrics, invalid readings as NaN, rows without any reading or
+# timestamp dropped, and one row per timestamp (the last reading of each
+# metric wins).
+def clean_chunk(frame):
+    headers = {normalize_header(c): c for c in frame.columns}
+    ts_col = next((headers[n] for n in TIMESTAMP_NAMES if n in headers), None)
+    if ts_col is None:
+        raise ValueError("No timestamp column (expected one of: " + ", ".join(TIMESTAMP_NAMES) + ")")
+    metrics = {}
+    for norm, original in headers.items():
+        name = ALIASES.get(norm) or next((m for m in COLUMNS if normalize_header(m) == norm), None)
+        if name and name not in metrics:
+            metrics[name] = original
+    if not metrics:
+        raise ValueError("No known metric columns (" + ", ".join(COLUMNS) + ")")
+
+    ts = parse_timestamps(frame[ts_col])
+    valid = ~np.isnat(ts)
+    values = {}
+    for name, original in metrics.items():
+        column = pd.to_numeric(frame[original], errors="coerce").to_numpy(dtype=np.float32, na_value=np.nan)
+        low, high = VALID_RANGES[name]
+        column[(column < low) | (column > high)] = np.nan
+        values[name] = column
+    has_reading = np.zeros(len(frame), dtype=bool)
+    for column in values.values():
+        has_reading |= ~np.isnan(column)
+    keep = valid & has_reading
+    ts = ts[keep].astype(np.int64)
+    values = {name: column[keep] for name, column in values.items()}
+    order = np.argsort(ts, kind="stable")
+    ts, values = dedupe_last(ts[order], {name: column[order] for name, column in values.items()})
+    return ts, values, int(len(frame) - keep.sum()), int(keep.sum() - len(ts))
+
+
+# One upload being imported. Counters are updated after every chunk.
+class IngestJob:
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.bytes_read = 0
+        self.rows_read = 0
+        self.rows_written = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.chunks = 0
+        self.message = "Queued"
+        self.future = None
+
+    @property
+    def progress(self):
+        return min(1.0, self.bytes_read / self.size) if self.size else 0.0
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def error(self):
+        return self.future.exception() if self.done() else None
+
+
+class Ingestor:
+    def __init__(self, store, max_workers=1, chunk_rows=CHUNK_ROWS):
+        self.store = store
+        self.chunk_rows = chunk_rows
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+
+    # `path` is a file the job owns; it is removed once imported.
+    def submit(self, patient, path, name=None, fmt=None):
+        job = IngestJob(name or os.path.basename(path), os.path.getsize(path))
+        job.future = self._executor.submit(self._run, job, str(patient), path, fmt)
+        return job
+
+    def _run(self, job, patient, path, fmt):
+        try:
+            job.message = "Reading"
+            with open(path, "rb") as f:
+                for frame in read_chunks(f, fmt or sniff_format(path), self.chunk_rows):
+                    ts, values, rejected, duplicates = clean_chunk(frame)
+                    job.rows_read += len(frame)
+                    job.rejected += rejected
+                    job.duplicates += duplicates
+                    # One bulk append per chunk; rows repeated across chunks
+                    # are merged by the store per column
+                    if len(ts):
+                        self.store.append(patient, ts.astype("datetime64[s]"), values)
+                        job.rows_written += len(ts)
+                    job.chunks += 1
+                    job.bytes_read = f.tell()
+                    job.message = f"Imported {job.rows_written:,} rows"
+            job.bytes_read = job.size
+            job.message = "Done"
+            return job.rows_written
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
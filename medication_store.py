@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from shared_state import VersionConflict
+
+REFILL_THRESHOLD_DAYS = 30
+
+
+# A patient's medication list, kept as one versioned document in the shared
+# state store: {"medications": [{name, dosage, frequency, remaining,
+# refill_requested}, ...]}. Updates take the version the caller rendered
+# and raise VersionConflict if another replica changed the list since.
+class MedicationRepository:
+    def __init__(self, state):
+        self.state = state
+
+    @staticmethod
+    def _key(patient):
+        return f"medications:{patient}"
+
+    # (medications, version); version 0 means nothing is stored yet
+    def list(self, patient):
+        doc, version = self.state.get(self._key(patient), {"medications": []})
+        return doc["medications"], version
+
+    def seed(self, patient, medications):
+        if self.list(patient)[1]:
+            return
+        try:
+            self.state.set(self._key(patient), {"medications": list(medications)}, expected=0)
+        except VersionConflict:
+            pass
+
+    def request_refill(self, patient, name, version):
+        medications, current = self.list(patient)
+        if current != version:
+            raise VersionConflict(self._key(patient), version, current)
+        for med in medications:
+            if med["name"] == name:
+                med["refill_requested"] = datetime.now().strftime("%Y-%m-%d %H:%M")
+                break
+        else:
+            raise KeyError(name)
+        return self.state.set(self._key(patient), {"medications": medications}, expected=version)
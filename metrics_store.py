@@ -0,0 +1,248 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:     # Windows: writes are only serialized within a process
+    fcntl = None
+
+# Columnar, append-only store for patient health metrics. Each patient has
+# one directory per calendar month holding one raw little-endian file per
+# column, so a date-range read memory-maps only the months it overlaps:
+#
+#   <root>/<patient>/<YYYY-MM>/timestamp.bin   int64 seconds since epoch
+#   <root>/<patient>/<YYYY-MM>/heart_rate.bin  float32, one value per row
+#
+# Rows inside a partition are kept sorted by timestamp and unique.
+TIMESTAMP = "timestamp"
+COLUMNS = {
+    "Heart Rate": "heart_rate",
+    "Blood Pressure": "blood_pressure",
+    "Sleep Hours": "sleep_hours",
+    "Steps": "steps",
+}
+TS_DTYPE = np.dtype("<i8")
+VALUE_DTYPE = np.dtype("<f4")
+
+
+def to_epoch_seconds(values):
+    return np.asarray(values, dtype="datetime64[s]").astype(TS_DTYPE)
+
+
+def month_of(ts):
+    return ts.astype("datetime64[s]").astype("datetime64[M]")
+
+
+class MetricsStore:
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._listeners = []
+        os.makedirs(root, exist_ok=True)
+
+    # `listener(patient, timestamps, values)` is called after every append
+    # with the sorted batch, e.g. to keep rolling statistics up to date.
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    # --- paths -----------------------------------------------------------
+    def _patient_dir(self, patient):
+        return os.path.join(self.root, str(patient))
+
+    def _column_path(self, patient, month, column):
+        return os.path.join(self._patient_dir(patient), str(month), f"{column}.bin")
+
+    def partitions(self, patient):
+        path = self._patient_dir(patient)
+        if not os.path.isdir(path):
+            return []
+        names = [name for name in os.listdir(path) if len(name) == 7 and name[4] == "-"]
+        return sorted(np.datetime64(name, "M") for name in names)
+
+    # Changes whenever the partition's rows do (appends grow the timestamp
+    # file, merges replace it), so derived data can tell it is stale
+    def partition_signature(self, patient, month):
+        try:
+            st = os.stat(self._column_path(patient, month, TIMESTAMP))
+        except FileNotFoundError:
+            return (0, 0, 0)
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def version(self, patient):
+        try:
+            with open(os.path.join(self._patient_dir(patient), "VERSION")) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _bump_version(self, patient):
+        path = os.path.join(self._patient_dir(patient), "VERSION")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(self.version(patient) + 1))
+        os.replace(tmp, path)
+
+    # --- reads -----------------------------------------------------------
+    def _map(self, patient, month, column, dtype, rows=None):
+        path = self._column_path(patient, month, column)
+        try:
+            size = os.path.getsize(path) // dtype.itemsize
+        except FileNotFoundError:
+            size = 0
+        if rows is None:
+            rows = size
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        if size < rows:
+            # Column added after the partition was written: fill with NaN.
+            padded = np.full(rows, np.nan, dtype=dtype)
+            if size:
+                padded[:size] = np.memmap(path, dtype=dtype, mode="r")
+            return padded
+        return np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+
+    def read_partition(self, patient, month, columns=None):
+        columns = list(COLUMNS) if columns is None else columns
+        ts = self._map(patient, month, TIMESTAMP, TS_DTYPE)
+        out = {TIMESTAMP: ts}
+        for name in columns:
+            out[name] = self._map(patient, month, COLUMNS[name], VALUE_DTYPE, rows=len(ts))
+        return out
+
+    # Returns {"timestamp": int64 seconds, "<column>": float32} for
+    # start <= t < end. Reads that fall inside one month are zero-copy views
+    # of the memory-mapped files; wider ranges concatenate per-month slices.
+    def read(self, patient, start=None, end=None, columns=None):
+        columns = list(COLUMNS) if columns is None else columns
+        start_s = None if start is None else to_epoch_seconds(start)
+        end_s = None if end is None else to_epoch_seconds(end)
+        first = None if start_s is None else month_of(start_s)
+        last = None if end_s is None else month_of(end_s - 1)
+        pieces = []
+        for month in self.partitions(patient):
+            if (first is not None and month < first) or (last is not None and month > last):
+                continue
+            part = self.read_partition(patient, month, columns)
+            ts = part[TIMESTAMP]
+            lo = 0 if start_s is None else int(np.searchsorted(ts, start_s, side="left"))
+            hi = len(ts) if end_s is None else int(np.searchsorted(ts, end_s, side="left"))
+            if hi > lo:
+                pieces.append({k: v[lo:hi] for k, v in part.items()})
+        if not pieces:
+            empty = {TIMESTAMP: np.empty(0, dtype=TS_DTYPE)}
+            empty.update({name: np.empty(0, dtype=VALUE_DTYPE) for name in columns})
+            return empty
+        if len(pieces) == 1:
+            return pieces[0]
+        return {k: np.concatenate([p[k] for p in pieces]) for k in pieces[0]}
+
+    def bounds(self, patient):
+        months = self.partitions(patient)
+        if not months:
+            return None
+        first = self._map(patient, months[0], TIMESTAMP, TS_DTYPE)
+        last = self._map(patient, months[-1], TIMESTAMP, TS_DTYPE)
+        if not len(first) or not len(last):
+            return None
+        return int(first[0]), int(last[-1])
+
+    # --- writes ----------------------------------------------------------
+    # Appends samples. `values` maps column names to arrays the same length
+    # as `timestamps`; missing columns are stored as NaN. Batches newer than
+    # a partition's last row are appended in place; older or overlapping
+    # batches merge into that month only: per timestamp the last non-NaN
+    # value of each column wins.
+    def append(self, patient, timestamps, values):
+        ts = to_epoch_seconds(timestamps)
+        if not len(ts):
+            return 0
+        cols = {name: np.full(len(ts), np.nan, dtype=VALUE_DTYPE) for name in COLUMNS}
+        for name, arr in values.items():
+            if name not in COLUMNS:
+                raise KeyError(f"Unknown metric column: {name}")
+            cols[name] = np.asarray(arr, dtype=VALUE_DTYPE)
+        order = np.argsort(ts, kind="stable")
+        ts = ts[order]
+        cols = {name: arr[order] for name, arr in cols.items()}
+        months = month_of(ts)
+        boundaries = np.flatnonzero(months[1:] != months[:-1]) + 1
+        written = 0
+        with self._writer(patient):
+            for lo, hi in zip(np.r_[0, boundaries], np.r_[boundaries, len(ts)]):
+                written += self._append_month(patient, months[lo], ts[lo:hi],
+                                              {n: a[lo:hi] for n, a in cols.items()})
+            self._bump_version(patient)
+        for listener in self._listeners:
+            listener(patient, ts, cols)
+        return written
+
+    # Serializes writers to a patient's files, across threads and (through an
+    # flock on <patient>/LOCK) across processes sharing the directory
+    @contextmanager
+    def _writer(self, patient):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self._patient_dir(patient), exist_ok=True)
+            with open(os.path.join(self._patient_dir(patient), "LOCK"), "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                yield
+
+    def _append_month(self, patient, month, ts, cols):
+        ts, cols = dedupe_last(ts, cols)
+        existing = self._map(patient, month, TIMESTAMP, TS_DTYPE)
+        if len(existing) and ts[0] <= existing[-1]:
+            return self._merge_month(patient, month, existing, ts, cols)
+        os.makedirs(os.path.dirname(self._column_path(patient, month, TIMESTAMP)), exist_ok=True)
+        # Value columns first, timestamps last: the timestamp column defines
+        # how many rows a reader sees, so a torn append is trimmed here.
+        for name, arr in cols.items():
+            path = self._column_path(patient, month, COLUMNS[name])
+            if os.path.exists(path) and os.path.getsize(path) > len(existing) * VALUE_DTYPE.itemsize:
+                os.truncate(path, len(existing) * VALUE_DTYPE.itemsize)
+            with open(path, "ab") as f:
+                f.write(arr.astype(VALUE_DTYPE, copy=False).tobytes())
+        with open(self._column_path(patient, month, TIMESTAMP), "ab") as f:
+            f.write(ts.tobytes())
+        return len(ts)
+
+    def _merge_month(self, patient, month, existing_ts, ts, cols):
+        old = self.read_partition(patient, month)
+        before = len(existing_ts)
+        merged_ts = np.concatenate([np.asarray(existing_ts), ts])
+        merged = {n: np.concatenate([np.asarray(old[n]), cols[n]]) for n in COLUMNS}
+        order = np.argsort(merged_ts, kind="stable")
+        merged_ts, merged = dedupe_last(merged_ts[order], {n: a[order] for n, a in merged.items()})
+        del old, existing_ts
+        for name, arr in merged.items():
+            _atomic_write(self._column_path(patient, month, COLUMNS[name]), arr.astype(VALUE_DTYPE))
+        _atomic_write(self._column_path(patient, month, TIMESTAMP), merged_ts)
+        return len(merged_ts) - before
+
+
+# ts is sorted; keeps one row per timestamp. Each column takes the last
+# non-NaN value written for that timestamp, so a batch carrying only some
+# metrics (e.g. a steps-only export) does not blank the others.
+def dedupe_last(ts, cols):
+    if len(ts) < 2:
+        return ts, cols
+    starts = np.flatnonzero(np.r_[True, ts[1:] != ts[:-1]])
+    if len(starts) == len(ts):
+        return ts, cols
+    rows = np.arange(len(ts))
+    merged = {}
+    for name, arr in cols.items():
+        last = np.maximum.reduceat(np.where(np.isnan(arr), -1, rows), starts)
+        merged[name] = np.where(last >= 0, arr[np.maximum(last, 0)], np.nan).astype(arr.dtype, copy=False)
+    return ts[starts], merged
+
+
+def _atomic_write(path, arr):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(np.ascontiguousarray(arr).tobytes())
+    os.replace(tmp, path)
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+# AI-written report sections. Each section is one LLM prompt; all of a
+# report's prompts are sent at once with asyncio.gather, at most
+# `concurrency` in flight, so a report takes about as long as its slowest
+# section instead of the sum of all of them. A section that fails or runs
+# past `timeout` seconds is left out (None) and the others still arrive;
+# `on_section(name, text, error, seconds)` is called as each one finishes.
+
+SECTIONS = ["Vitals Interpretation", "Medication Adherence", "Nutrition Summary", "Appointment Recap"]
+
+
+class Narrator:
+    # `ask(prompt)` is a coroutine function returning the answer text;
+    # `run(coro)` schedules a coroutine on the loop `ask` belongs to and
+    # returns a concurrent.futures.Future (GroqGateway.run_async).
+    def __init__(self, ask, run, concurrency=4, timeout=30.0):
+        self.ask = ask
+        self.run = run
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    # {name: text or None}; blocks the calling (worker) thread until every
+    # section has finished or timed out
+    def write(self, prompts, on_section=None):
+        return self.run(self.gather(prompts, on_section)).result()
+
+    async def gather(self, prompts, on_section=None):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def section(name, prompt):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    text = await asyncio.wait_for(self.ask(prompt), self.timeout)
+                    error = None
+                except asyncio.TimeoutError:
+                    text, error = None, f"timed out after {self.timeout:.0f}s"
+                except Exception as e:
+                    text, error = None, str(e) or type(e).__name__
+            if on_section is not None:
+                on_section(name, text, error, time.perf_counter() - started)
+            return name, text
+
+        return dict(await asyncio.gather(*(section(name, prompt) for name, prompt in prompts.items())))
+
+
+def _stat(summary, name, unit):
+    stats = summary.get(name)
+    if stats is None:
+        return f"- {name}: no readings"
+    return (f"- {name}: mean {stats['mean']:.1f} {unit}, median {stats['p50']:.1f}, "
+            f"range {stats['min']:.1f}-{stats['max']:.1f}, {stats['count']} readings")
+
+
+# One prompt per section from the report's data; every prompt asks for a
+# short plain-text paragraph so the sections fit the PDF layout
+def section_prompts(start, end, summary, context):
+    period = f"from {start} to {end}"
+    style = "Answer in one short paragraph of plain text (no markdown, no lists), addressed to the patient."
+    medications = context.get("medications", [])
+    appointments = [a for a in context.get("appointments", []) if str(start) <= a.date <= str(end)]
+    questions = context.get("nutrition_questions", [])
+    return {
+        "Vitals Interpretation": (
+            f"Interpret these health metrics for the period {period}:\n"
+            + "\n".join(_stat(summary, name, unit) for name, unit in
+                        (("Heart Rate", "BPM"), ("Blood Pressure", "mmHg (systolic)"),
+                         ("Sleep Hours", "hours"), ("Steps", "steps per reading")))
+            + f"\nPoint out anything outside healthy ranges. {style}"),
+        "Medication Adherence": (
+            "Review adherence for these medications (days of supply remaining, refill requests):\n"
+            + ("\n".join(f"- {m['name']} {m['dosage']}, {m['frequency']}: {m['remaining']} days left"
+                         + (f", refill requested {m['refill_requested']}" if m.get("refill_requested") else "")
+                         for m in medications) or "- none on file")
+            + f"\nFlag anything that needs a refill soon. {style}"),
+        "Nutrition Summary": (
+            f"Summarize the patient's nutrition focus {period} based on the questions they asked:\n"
+            + ("\n".join(f"- {q}" for q in questions[-10:]) or "- no nutrition questions asked")
+            + f"\nGive one or two practical suggestions. {style}"),
+        "Appointment Recap": (
+            f"Recap the patient's appointments {period}:\n"
+            + ("\n".join(f"- {a.date} {a.time}: {a.doctor} ({a.specialty}), {a.status}" for a in appointments)
+               or "- no appointments")
+            + f"\nMention what to prepare for upcoming visits. {style}"),
+    }
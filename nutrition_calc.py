@@ -0,0 +1,84 @@
+import numpy as np
+
+# Energy and macro calculations for the Nutrition page. Every function takes
+# scalars or equal-length arrays (e.g. DataFrame columns), so one call can
+# score a single patient or a whole cohort.
+
+ACTIVITY_LEVELS = {
+    "Sedentary (little or no exercise)": 1.2,
+    "Lightly active (1-3 days/week)": 1.375,
+    "Moderately active (3-5 days/week)": 1.55,
+    "Very active (6-7 days/week)": 1.725,
+    "Extra active (physical job or twice daily)": 1.9,
+}
+GOALS = {"Lose weight": -500, "Maintain weight": 0, "Gain weight": 300}
+# Share of calories from protein, carbohydrate and fat
+MACRO_SPLITS = {
+    "Balanced": (0.30, 0.40, 0.30),
+    "High protein": (0.40, 0.35, 0.25),
+    "Low carb": (0.35, 0.25, 0.40),
+}
+KCAL_PER_GRAM = {"protein": 4.0, "carbs": 4.0, "fat": 9.0}
+FORMULAS = ("mifflin", "harris")
+
+
+def _is_male(sex):
+    return np.char.lower(np.asarray(sex, dtype=str)) == "male"
+
+
+# Mifflin-St Jeor (1990)
+def mifflin_st_jeor(weight_kg, height_cm, age, sex):
+    weight_kg, height_cm, age = (np.asarray(v, dtype=np.float64) for v in (weight_kg, height_cm, age))
+    return 10.0 * weight_kg + 6.25 * height_cm - 5.0 * age + np.where(_is_male(sex), 5.0, -161.0)
+
+
+# Harris-Benedict, revised by Roza and Shizgal (1984)
+def harris_benedict(weight_kg, height_cm, age, sex):
+    weight_kg, height_cm, age = (np.asarray(v, dtype=np.float64) for v in (weight_kg, height_cm, age))
+    male = 88.362 + 13.397 * weight_kg + 4.799 * height_cm - 5.677 * age
+    female = 447.593 + 9.247 * weight_kg + 3.098 * height_cm - 4.330 * age
+    return np.where(_is_male(sex), male, female)
+
+
+def bmr(weight_kg, height_cm, age, sex, formula="mifflin"):
+    if formula not in FORMULAS:
+        raise ValueError(f"Unknown BMR formula: {formula}")
+    if formula == "mifflin":
+        return mifflin_st_jeor(weight_kg, height_cm, age, sex)
+    return harris_benedict(weight_kg, height_cm, age, sex)
+
+
+def tdee(bmr_kcal, activity):
+    factors = np.vectorize(ACTIVITY_LEVELS.__getitem__, otypes=[np.float64])(activity)
+    return np.asarray(bmr_kcal, dtype=np.float64) * factors
+
+
+def macros(calories, split="Balanced"):
+    calories = np.asarray(calories, dtype=np.float64)
+    shares = np.array([MACRO_SPLITS[s] for s in np.atleast_1d(split)])
+    if np.ndim(split) == 0:
+        shares = shares[0]
+    grams = {}
+    for i, name in enumerate(("protein", "carbs", "fat")):
+        grams[name] = calories * shares[..., i] / KCAL_PER_GRAM[name]
+    return grams
+
+
+def bmi(weight_kg, height_cm):
+    height_m = np.asarray(height_cm, dtype=np.float64) / 100.0
+    return np.asarray(weight_kg, dtype=np.float64) / (height_m * height_m)
+
+
+# Full plan for one patient or a cohort: returns a dict of arrays (or
+# 0-d arrays for scalar input) with bmr, tdee, target calories and grams of
+# protein/carbs/fat per day.
+def calorie_plan(age, weight_kg, height_cm, sex, activity, goal="Maintain weight",
+                 split="Balanced", formula="mifflin"):
+    base = bmr(weight_kg, height_cm, age, sex, formula)
+    maintenance = tdee(base, activity)
+    adjustment = np.vectorize(GOALS.__getitem__, otypes=[np.float64])(goal)
+    # Never plan below the resting requirement
+    target = np.maximum(maintenance + adjustment, base)
+    plan = {"bmr": base, "tdee": maintenance, "target": target, "bmi": bmi(weight_kg, height_cm)}
+    plan.update(macros(target, split))
+    return plan
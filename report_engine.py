@@ -0,0 +1,252 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from fpdf import FPDF
+
+from metrics_store import COLUMNS
+from rollups import DAY
+
+REPORT_TYPES = ["Health Summary", "Medication History", "Vital Signs", "Lab Results", "AI Health Narrative"]
+METRIC_UNITS = {"Heart Rate": "BPM", "Blood Pressure": "mmHg", "Sleep Hours": "hrs", "Steps": "steps"}
+
+
+# A report being built in the background. `progress` runs from 0.0 to 1.0;
+# `result()` returns the PDF bytes once the job has finished. AI-written
+# sections land in `sections` ({name: text or None}) as they complete.
+class ReportJob:
+    def __init__(self, key):
+        self.key = key
+        self.progress = 0.0
+        self.message = "Queued"
+        self.sections = {}
+        self.future = None
+        self.data = None
+        self.cached = False
+
+    def update(self, progress, message):
+        self.progress = progress
+        self.message = message
+
+    def section(self, name, text):
+        self.sections[name] = text
+
+    def done(self):
+        return self.data is not None or (self.future is not None and self.future.done())
+
+    def result(self):
+        if self.data is None:
+            self.data = self.future.result()
+        return self.data
+
+    @property
+    def filename(self):
+        patient, report_type, start, end, _ = self.key
+        return f"dr_well_{report_type.lower().replace(' ', '_')}_{start}_{end}.pdf"
+
+
+# Builds report PDFs on a bounded thread pool so the Streamlit script thread
+# never blocks. Metrics come from the store's rollups (rollups.Rollups), so
+# a report over years of samples combines pre-aggregated buckets instead of
+# scanning them. Finished PDFs are kept in an LRU keyed by
+# (patient, report type, start, end, data version).
+class ReportEngine:
+    def __init__(self, rollups, max_workers=2, cache_size=32):
+        self.rollups = rollups
+        self.cache_size = cache_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, patient, report_type, start, end, data_version, context=None):
+        if report_type not in REPORT_TYPES:
+            raise ValueError(f"Unknown report type: {report_type}")
+        key = (str(patient), report_type, str(start), str(end), data_version)
+        job = ReportJob(key)
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+                job.data = data
+                job.cached = True
+                job.update(1.0, "Ready")
+                return job
+        job.future = self._executor.submit(self._build, job, patient, report_type, start, end, context or {})
+        return job
+
+    def cached(self, patient):
+        with self._lock:
+            return [(key, data) for key, data in self._cache.items() if key[0] == str(patient)]
+
+    def _build(self, job, patient, report_type, start, end, context):
+        job.update(0.05, "Collecting data")
+        builder = BUILDERS[report_type]
+        pdf = new_document(report_type, patient, start, end)
+        builder(pdf, self.rollups, patient, start, end, dict(context, on_section=job.section), job.update)
+        job.update(0.95, "Rendering PDF")
+        data = render(pdf)
+        # A report missing sections is not reused; asking again retries them
+        if None not in job.sections.values():
+            with self._lock:
+                self._cache[job.key] = data
+                self._cache.move_to_end(job.key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        job.update(1.0, "Ready")
+        return data
+
+
+def new_document(title, patient, start, end):
+    pdf = FPDF()
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 18)
+    pdf.cell(0, 12, f"Dr. Well - {title}", ln=1)
+    pdf.set_font("Arial", "", 10)
+    pdf.cell(0, 6, f"Patient ID: #{patient}", ln=1)
+    pdf.cell(0, 6, f"Period: {start} to {end}", ln=1)
+    pdf.cell(0, 6, f"Generated: {datetime.now():%Y-%m-%d %H:%M}", ln=1)
+    pdf.ln(4)
+    return pdf
+
+
+def render(pdf):
+    out = pdf.output(dest="S")
+    return out.encode("latin-1") if isinstance(out, str) else bytes(out)
+
+
+def heading(pdf, text):
+    pdf.set_font("Arial", "B", 13)
+    pdf.cell(0, 9, text, ln=1)
+    pdf.set_font("Arial", "", 10)
+
+
+def table(pdf, header, rows, widths):
+    pdf.set_font("Arial", "B", 10)
+    for title, width in zip(header, widths):
+        pdf.cell(width, 7, title, border=1)
+    pdf.ln()
+    pdf.set_font("Arial", "", 10)
+    for row in rows:
+        for value, width in zip(row, widths):
+            pdf.cell(width, 6, latin1(value), border=1)
+        pdf.ln()
+    pdf.ln(3)
+
+
+def latin1(value):
+    return str(value).encode("latin-1", "replace").decode("latin-1")
+
+
+# Epoch seconds covering the days start..end inclusive
+def day_span(start, end):
+    return (int(np.datetime64(start, "D").astype(np.int64)) * DAY,
+            (int(np.datetime64(end, "D").astype(np.int64)) + 1) * DAY)
+
+
+def build_health_summary(pdf, rollups, patient, start, end, context, progress):
+    summary = rollups.summary(patient, *day_span(start, end))
+    progress(0.4, "Summarizing metrics")
+    heading(pdf, "Health Metrics")
+    rows = []
+    for name in COLUMNS:
+        stats = summary[name]
+        if stats is None:
+            rows.append([name, 0, "-", "-", "-", "-"])
+            continue
+        rows.append([f"{name} ({METRIC_UNITS[name]})", stats["count"], f"{stats['mean']:.1f}",
+                     f"{stats['p50']:.1f}", f"{stats['min']:.1f}", f"{stats['max']:.1f}"])
+    table(pdf, ["Metric", "Samples", "Mean", "Median", "Min", "Max"], rows, [55, 25, 25, 25, 25, 25])
+    progress(0.7, "Adding appointments and medications")
+    appointments = [a for a in context.get("appointments", []) if str(start) <= a.date <= str(end)]
+    heading(pdf, "Appointments")
+    table(pdf, ["Date", "Doctor", "Specialty", "Status"],
+          [[a.date, a.doctor, a.specialty, a.status] for a in appointments] or [["-", "None in this period", "", ""]],
+          [30, 70, 50, 30])
+    heading(pdf, "Current Medications")
+    table(pdf, ["Medication", "Dosage", "Frequency"],
+          [[m["name"], m["dosage"], m["frequency"]] for m in context.get("medications", [])],
+          [70, 50, 60])
+
+
+def build_medication_history(pdf, rollups, patient, start, end, context, progress):
+    progress(0.5, "Listing medications")
+    heading(pdf, "Medications")
+    table(pdf, ["Medication", "Dosage", "Frequency", "Days remaining"],
+          [[m["name"], m["dosage"], m["frequency"], m["remaining"]] for m in context.get("medications", [])],
+          [60, 40, 50, 40])
+
+
+# Table granularity by period length, so long ranges stay a few pages
+def vitals_level(start, end):
+    days = (np.datetime64(end, "D") - np.datetime64(start, "D")).astype(int) + 1
+    if days <= 62:
+        return "day", "Daily Averages", "Date"
+    if days <= 731:
+        return "week", "Weekly Averages", "Week of"
+    return "month", "Monthly Averages", "Month"
+
+
+def build_vital_signs(pdf, rollups, patient, start, end, context, progress):
+    vitals = ["Heart Rate", "Blood Pressure", "Sleep Hours"]
+    level, title, label = vitals_level(start, end)
+    series = rollups.series(patient, start, end, level, vitals)
+    progress(0.4, f"Aggregating {title.lower()}")
+    heading(pdf, title)
+    rows = []
+    for period, means in series:
+        period = str(period.astype("datetime64[M]")) if level == "month" else str(period)
+        rows.append([period] + ["-" if means[n] is None else f"{means[n]:.1f}" for n in vitals])
+    progress(0.7, "Writing table")
+    table(pdf, [label] + [f"{n} ({METRIC_UNITS[n]})" for n in vitals],
+          rows or [["-", "No samples in this period", "", ""]], [35, 50, 55, 50])
+
+
+def build_lab_results(pdf, rollups, patient, start, end, context, progress):
+    progress(0.5, "Collecting lab reports")
+    labs = [r for r in context.get("lab_reports", []) if str(start) <= r["date"] <= str(end)]
+    heading(pdf, "Lab Results")
+    table(pdf, ["Date", "Report", "Type"],
+          [[r["date"], r["name"], r["type"]] for r in labs] or [["-", "No lab results on file for this period", ""]],
+          [35, 100, 50])
+
+
+# Sections written by Dr. Well, requested concurrently through
+# context["narrator"] (narrative.Narrator); a section that failed or timed
+# out is noted in the PDF and the rest of the report still goes out.
+def build_ai_narrative(pdf, rollups, patient, start, end, context, progress):
+    from narrative import section_prompts
+    summary = rollups.summary(patient, *day_span(start, end))
+    prompts = section_prompts(start, end, summary, context)
+    written = []
+    progress(0.1, f"Writing {len(prompts)} sections")
+
+    def on_section(name, text, error, seconds):
+        written.append(name)
+        context["on_section"](name, text)
+        progress(0.1 + 0.8 * len(written) / len(prompts),
+                 f"{name} written in {seconds:.1f}s" if error is None else f"{name} failed: {error}")
+
+    sections = context["narrator"].write(prompts, on_section)
+    for name in prompts:
+        heading(pdf, name)
+        if sections[name] is None:
+            pdf.set_font("Arial", "I", 10)
+            pdf.multi_cell(0, 6, "This section could not be generated. Generate the report again to retry.")
+            pdf.set_font("Arial", "", 10)
+        else:
+            pdf.multi_cell(0, 6, latin1(sections[name]))
+        pdf.ln(3)
+    pdf.set_font("Arial", "I", 8)
+    pdf.multi_cell(0, 5, "Written by Dr. Well, an AI assistant. Not a substitute for advice from your doctor.")
+
+
+BUILDERS = {
+    "Health Summary": build_health_summary,
+    "Medication History": build_medication_history,
+    "Vital Signs": build_vital_signs,
+    "Lab Results": build_lab_results,
+    "AI Health Narrative": build_ai_narrative,
+}
@@ -0,0 +1,267 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics_store import COLUMNS, TIMESTAMP, month_of
+
+# Pre-aggregated metrics for date-range queries. For every month partition
+# of the MetricsStore a sidecar file holds one row per day — count, sum,
+# min, max and a log-bucketed histogram per column — and the month's total
+# is folded from those rows on load. A range query then combines whole
+# months, the day rows of partially covered months and, for boundaries that
+# fall inside a day, the raw samples of those edge days only:
+#
+#   <root>/<patient>/<YYYY-MM>.npz
+#
+# Each sidecar records the signature of the partition it was built from, so
+# a partition rewritten by any process is re-aggregated on the next read.
+# Appends in this process rebuild the months they touched right away.
+
+DAY = 86400
+LEVELS = ("day", "week", "month")
+# Histogram bins grow by 5%, so percentiles are within ~2.5% of the exact
+# value. Values below / above the range land in an under- / overflow bin.
+GAMMA = 1.05
+SKETCH_RANGES = {
+    "Heart Rate": (20, 250),
+    "Blood Pressure": (50, 260),
+    "Sleep Hours": (0.1, 24),
+    "Steps": (1, 100_000),
+}
+MAX_CACHED_MONTHS = 600
+
+
+def _bins(low, high):
+    return int(math.ceil(math.log(high / low) / math.log(GAMMA))) + 2
+
+
+NAMES = list(COLUMNS)
+BINS = [_bins(*SKETCH_RANGES[name]) for name in NAMES]
+OFFSETS = np.r_[0, np.cumsum(BINS)]
+
+
+def bin_index(name, values):
+    low, _ = SKETCH_RANGES[name]
+    n = BINS[NAMES.index(name)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        idx = np.floor(np.log(np.asarray(values, dtype=np.float64) / low) / math.log(GAMMA)) + 1
+    return np.clip(np.nan_to_num(idx, nan=0.0, neginf=0.0), 0, n - 1).astype(np.int64)
+
+
+def bin_value(name, i):
+    low, _ = SKETCH_RANGES[name]
+    return low * GAMMA ** (i - 1) * math.sqrt(GAMMA)
+
+
+# Per-day aggregates of sorted samples: (days, count, sum, min, max, hist)
+# with one row per day that has samples and one column per metric.
+def aggregate(ts, values):
+    days = np.asarray(ts, dtype=np.int64) // DAY
+    if not len(days):
+        return empty_rows()
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    rows = len(starts)
+    count = np.zeros((rows, len(NAMES)), dtype=np.int64)
+    total = np.zeros((rows, len(NAMES)), dtype=np.float64)
+    low = np.full((rows, len(NAMES)), np.nan, dtype=np.float64)
+    high = np.full((rows, len(NAMES)), np.nan, dtype=np.float64)
+    hist = np.zeros((rows, OFFSETS[-1]), dtype=np.int64)
+    row_of = np.repeat(np.arange(rows), np.diff(np.r_[starts, len(days)]))
+    for c, name in enumerate(NAMES):
+        column = np.asarray(values[name], dtype=np.float64)
+        valid = ~np.isnan(column)
+        count[:, c] = np.add.reduceat(valid.astype(np.int64), starts)
+        total[:, c] = np.add.reduceat(np.where(valid, column, 0.0), starts)
+        mins = np.minimum.reduceat(np.where(valid, column, np.inf), starts)
+        maxs = np.maximum.reduceat(np.where(valid, column, -np.inf), starts)
+        low[:, c] = np.where(np.isinf(mins), np.nan, mins)
+        high[:, c] = np.where(np.isinf(maxs), np.nan, maxs)
+        flat = row_of[valid] * BINS[c] + bin_index(name, column[valid])
+        hist[:, OFFSETS[c]:OFFSETS[c + 1]] = np.bincount(flat, minlength=rows * BINS[c]).reshape(rows, BINS[c])
+    return days[starts], count, total, low, high, hist
+
+
+def empty_rows():
+    return (np.empty(0, dtype=np.int64), np.empty((0, len(NAMES)), dtype=np.int64),
+            np.empty((0, len(NAMES))), np.empty((0, len(NAMES))), np.empty((0, len(NAMES))),
+            np.empty((0, OFFSETS[-1]), dtype=np.int64))
+
+
+# One month of day rows plus the month's total
+class MonthRollup:
+    def __init__(self, signature, days, count, total, low, high, hist):
+        self.signature = signature
+        self.days = days
+        self.rows = (count, total, low, high, hist)
+        self.month = fold(self.rows)
+
+    def select(self, first_day, end_day):
+        keep = (self.days >= first_day) & (self.days < end_day)
+        return self.days[keep], tuple(a[keep] for a in self.rows)
+
+
+# Combines aggregate rows (each a tuple of arrays with a leading row axis)
+# into one row
+def fold(rows):
+    count, total, low, high, hist = rows
+    return (count.sum(axis=0), total.sum(axis=0), np.fmin.reduce(low, axis=0, initial=np.nan),
+            np.fmax.reduce(high, axis=0, initial=np.nan), hist.sum(axis=0))
+
+
+def percentile(name, count, low, high, hist, q):
+    if not count:
+        return None
+    c = NAMES.index(name)
+    bins = hist[OFFSETS[c]:OFFSETS[c + 1]]
+    i = int(np.searchsorted(np.cumsum(bins), q * count, side="left"))
+    if i == 0:
+        return float(low)
+    if i >= len(bins) - 1:
+        return float(high)
+    return float(min(max(bin_value(name, i), low), high))
+
+
+class Rollups:
+    def __init__(self, store, root):
+        self.store = store
+        self.root = root
+        self.builds = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        store.subscribe(self._on_append)
+
+    def _path(self, patient, month):
+        return os.path.join(self.root, str(patient), f"{month}.npz")
+
+    def _on_append(self, patient, timestamps, values):
+        for month in np.unique(month_of(np.asarray(timestamps))):
+            self._month(patient, month)
+
+    # The month's rollup, rebuilt from the raw partition if it changed
+    def _month(self, patient, month):
+        signature = self.store.partition_signature(patient, month)
+        key = (str(patient), str(month))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached.signature == signature:
+                self._cache.move_to_end(key)
+                return cached
+        rollup = self._load(patient, month, signature) or self._build(patient, month, signature)
+        with self._lock:
+            self._cache[key] = rollup
+            self._cache.move_to_end(key)
+            while len(self._cache) > MAX_CACHED_MONTHS:
+                self._cache.popitem(last=False)
+        return rollup
+
+    def _load(self, patient, month, signature):
+        try:
+            with np.load(self._path(patient, month)) as f:
+                if tuple(f["signature"]) != signature:
+                    return None
+                return MonthRollup(signature, f["days"], f["count"], f["sum"], f["min"], f["max"], f["hist"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _build(self, patient, month, signature):
+        part = self.store.read_partition(patient, month)
+        days, count, total, low, high, hist = aggregate(part[TIMESTAMP], part)
+        path = self._path(patient, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp.npz"
+        np.savez(tmp, signature=np.array(signature, dtype=np.int64), days=days, count=count, sum=total,
+                 min=low, max=high, hist=hist.astype(np.int32 if hist.max(initial=0) < 2 ** 31 else np.int64))
+        os.replace(tmp, path)
+        self.builds += 1
+        return MonthRollup(signature, days, count, total, low, high, hist)
+
+    # Rollups of the months overlapping days [first_day, end_day)
+    def _months(self, patient, first_day, end_day):
+        first_month = np.datetime64(int(first_day), "D").astype("datetime64[M]")
+        last_month = np.datetime64(int(end_day) - 1, "D").astype("datetime64[M]")
+        for month in self.store.partitions(patient):
+            if first_month <= month <= last_month:
+                yield month, self._month(patient, month)
+
+    # Aggregate rows covering days [first_day, end_day) (epoch days): the
+    # month row for months wholly inside the span, day rows elsewhere
+    def _rows(self, patient, first_day, end_day):
+        pieces = []
+        for month, rollup in self._months(patient, first_day, end_day):
+            month_start = month.astype("datetime64[D]").astype(np.int64)
+            month_end = (month + 1).astype("datetime64[D]").astype(np.int64)
+            if first_day <= month_start and month_end <= end_day:
+                pieces.append(tuple(a[None] for a in rollup.month))
+            else:
+                pieces.append(rollup.select(first_day, end_day)[1])
+        return pieces
+
+    # {column: {count, mean, min, max, p50, p90}} (None for columns without
+    # samples) for start <= t < end, both epoch seconds
+    def summary(self, patient, start, end, columns=None):
+        columns = NAMES if columns is None else columns
+        first_day, end_day = -(-int(start) // DAY), int(end) // DAY
+        pieces = []
+        if first_day < end_day:
+            pieces = self._rows(patient, first_day, end_day)
+            edges = [(start, first_day * DAY), (end_day * DAY, end)]
+        else:
+            edges = [(start, end)]
+        for lo, hi in edges:
+            if lo < hi:
+                raw = self.store.read(patient, start=np.datetime64(int(lo), "s"), end=np.datetime64(int(hi), "s"))
+                pieces.append(aggregate(raw[TIMESTAMP], raw)[1:])
+        pieces = [p for p in pieces if len(p[0])]
+        if not pieces:
+            return {name: None for name in columns}
+        count, total, low, high, hist = fold(tuple(np.concatenate(a) for a in zip(*pieces)))
+        result = {}
+        for name in columns:
+            c = NAMES.index(name)
+            n = int(count[c])
+            result[name] = None if not n else {
+                "count": n, "mean": total[c] / n, "min": float(low[c]), "max": float(high[c]),
+                "p50": percentile(name, n, low[c], high[c], hist, 0.5),
+                "p90": percentile(name, n, low[c], high[c], hist, 0.9),
+            }
+        return result
+
+    # [(period start as datetime64[D], {column: mean or None}), ...] for the
+    # days first_day..last_day (inclusive, datetime64[D] or date strings),
+    # grouped by `level`: "day", "week" (starting Monday) or "month"
+    def series(self, patient, first_day, last_day, level="day", columns=None):
+        if level not in LEVELS:
+            raise ValueError(f"Unknown rollup level: {level}")
+        columns = NAMES if columns is None else columns
+        first = np.datetime64(first_day, "D").astype(np.int64)
+        end = np.datetime64(last_day, "D").astype(np.int64) + 1
+        days, parts = [], []
+        for _, rollup in self._months(patient, first, end):
+            d, rows = rollup.select(first, end)
+            days.append(d)
+            parts.append(rows[:2])
+        if not days or not sum(len(d) for d in days):
+            return []
+        days = np.concatenate(days)
+        count = np.concatenate([p[0] for p in parts])
+        total = np.concatenate([p[1] for p in parts])
+        if level == "day":
+            keys = days
+        elif level == "week":
+            keys = (days + 3) // 7 * 7 - 3      # epoch day 0 was a Thursday
+        else:
+            keys = days.astype("datetime64[D]").astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        count = np.add.reduceat(count, starts)
+        total = np.add.reduceat(total, starts)
+        rows = []
+        for i, key in enumerate(keys[starts]):
+            means = {}
+            for name in columns:
+                c = NAMES.index(name)
+                means[name] = total[i, c] / count[i, c] if count[i, c] else None
+            rows.append((np.datetime64(int(key), "D"), means))
+        return rows
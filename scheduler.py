@@ -0,0 +1,244 @@
+import heapq
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+
+from appointment_store import CANCELLED, SlotTaken
+
+EPOCH = datetime(2000, 1, 1)
+DAY = 24 * 60
+
+
+def to_minutes(date, time):
+    return int((datetime.fromisoformat(f"{date}T{time}") - EPOCH).total_seconds()) // 60
+
+
+def from_minutes(minutes):
+    moment = EPOCH + timedelta(minutes=minutes)
+    return moment.strftime("%Y-%m-%d"), moment.strftime("%H:%M")
+
+
+class SlotUnavailable(Exception):
+    def __init__(self, message, suggestion=None):
+        super().__init__(message)
+        self.suggestion = suggestion    # (date, time) of the doctor's next free slot
+
+
+# One doctor's bookings as sorted, disjoint busy blocks: back-to-back
+# appointments are merged into a single block, so whether a slot is free and
+# where the next gap starts are both one bisect, however many bookings sit
+# between. `booked` keeps the individual (start, id) pairs so a block can be
+# split again when one of its appointments moves or is cancelled.
+class DoctorCalendar:
+    def __init__(self, length):
+        self.length = length
+        self.starts = []
+        self.ends = []
+        self.booked = []
+        self.bookings = {}
+
+    def _block(self, minute):
+        i = bisect_right(self.starts, minute) - 1
+        return i if i >= 0 and self.ends[i] > minute else None
+
+    def is_free(self, start):
+        i = bisect_right(self.starts, start) - 1
+        if i >= 0 and self.ends[i] > start:
+            return False
+        return i + 1 >= len(self.starts) or self.starts[i + 1] >= start + self.length
+
+    # Start of the first free interval at or after `minute`, and where it ends
+    def gap_at(self, minute):
+        i = self._block(minute)
+        if i is not None:
+            minute = self.ends[i]
+            i += 1
+        else:
+            i = bisect_right(self.starts, minute)
+        return minute, self.starts[i] if i < len(self.starts) else None
+
+    def _cover(self, start, end):
+        i = bisect_left(self.ends, start)
+        j = bisect_right(self.starts, end)
+        if i < j:
+            start, end = min(start, self.starts[i]), max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def add(self, booking_id, start):
+        insort(self.booked, (start, booking_id))
+        self.bookings[booking_id] = start
+        self._cover(start, start + self.length)
+
+    def remove(self, booking_id):
+        start = self.bookings.pop(booking_id)
+        end = start + self.length
+        del self.booked[bisect_left(self.booked, (start, booking_id))]
+        i = self._block(start)
+        block_start, block_end = self.starts[i], self.ends[i]
+        del self.starts[i], self.ends[i]
+        for piece in ((end, block_end), (block_start, start)):
+            if piece[0] < piece[1]:
+                self.starts.insert(i, piece[0])
+                self.ends.insert(i, piece[1])
+        # Older data can hold overlapping bookings; they keep their time
+        lo = bisect_right(self.booked, (start - self.length, float("inf")))
+        hi = bisect_left(self.booked, (end, float("-inf")))
+        for other, _ in self.booked[lo:hi]:
+            self._cover(other, other + self.length)
+
+
+# Slot engine over an AppointmentRepository. Every active booking from today
+# on is held in a per-doctor DoctorCalendar; bookings and reschedules check
+# the calendar and write the repository under one lock, so two sessions
+# can't take the same slot in this process. Across processes the repository
+# rejects a taken slot itself, and refresh() applies bookings other
+# processes made. Appointments last `slot_minutes` and fall within opening
+# hours on clinic `days` (Mon=0).
+class Scheduler:
+    def __init__(self, repo, slot_minutes=30, opens="09:00", closes="17:00", days=(0, 1, 2, 3, 4), today=None):
+        self.repo = repo
+        self.slot = slot_minutes
+        self.opens = to_minutes("2000-01-01", opens)
+        self.closes = to_minutes("2000-01-01", closes)
+        self.days = frozenset(days)
+        self.calendars = {}
+        self.specialties = {}
+        self.today = today
+        self._lock = threading.Lock()
+        for apt in repo.active_since(today or datetime.now().date()):
+            self._track(apt.doctor, apt.specialty)
+            self.calendars[apt.doctor].add(apt.id, to_minutes(apt.date, apt.time))
+
+    def _track(self, doctor, specialty):
+        self.calendars.setdefault(doctor, DoctorCalendar(self.slot))
+        self.specialties.setdefault(specialty, set()).add(doctor)
+
+    def doctors(self, specialty):
+        return sorted(self.specialties.get(specialty, ()))
+
+    def _open_at(self, minute):
+        # Earliest opening-hours minute at or after `minute`, on the slot grid
+        day, offset = divmod(minute, DAY)
+        offset = max(offset, self.opens)
+        offset += -(offset - self.opens) % self.slot
+        while offset + self.slot > self.closes or (EPOCH + timedelta(days=day)).weekday() not in self.days:
+            day, offset = day + 1, self.opens
+        return day * DAY + offset
+
+    # Each step is a bisect that skips a whole busy block (or closed hours)
+    def _next_free(self, doctor, minute):
+        calendar = self.calendars.get(doctor) or DoctorCalendar(self.slot)
+        minute = self._open_at(minute)
+        while True:
+            start, gap_end = calendar.gap_at(minute)
+            candidate = self._open_at(start)
+            if candidate == start and (gap_end is None or start + self.slot <= gap_end):
+                return start
+            minute = candidate if candidate != start else gap_end
+
+    def next_free(self, doctor, date, time):
+        with self._lock:
+            return from_minutes(self._next_free(doctor, to_minutes(date, time)))
+
+    # The k earliest open slots across the specialty's doctors, merged with a
+    # heap: one next-free lookup per doctor plus one per slot returned.
+    def earliest(self, specialty, date, time, k=5, doctors=()):
+        after = to_minutes(date, time)
+        with self._lock:
+            heap = [(self._next_free(d, after), d) for d in sorted(set(self.doctors(specialty)) | set(doctors))]
+            heapq.heapify(heap)
+            slots = []
+            while heap and len(slots) < k:
+                start, doctor = heapq.heappop(heap)
+                slots.append((*from_minutes(start), doctor))
+                heapq.heappush(heap, (self._next_free(doctor, start + self.slot), doctor))
+        return slots
+
+    def _check(self, doctor, start):
+        if self._open_at(start) != start:
+            raise SlotUnavailable(f"Appointments start every {self.slot} minutes during clinic hours.",
+                                  from_minutes(self._next_free(doctor, start)))
+        calendar = self.calendars.get(doctor)
+        if calendar is not None and not calendar.is_free(start):
+            raise SlotUnavailable(f"{doctor} is already booked at that time.",
+                                  from_minutes(self._next_free(doctor, start)))
+
+    def _place(self, apt):
+        self._release(apt.id)
+        if apt.status != CANCELLED and apt.date >= str(self.today or datetime.now().date()):
+            self._track(apt.doctor, apt.specialty)
+            self.calendars[apt.doctor].add(apt.id, to_minutes(apt.date, apt.time))
+
+    # Re-reads one appointment after another process changed it
+    def refresh(self, appointment_id):
+        apt = self.repo.get(appointment_id)
+        with self._lock:
+            if apt is None:
+                self._release(appointment_id)
+            else:
+                self._place(apt)
+
+    # Another process took the slot before its change reached us: pick up
+    # the doctor's bookings from the repository and report the next gap
+    def _taken(self, doctor, start):
+        for apt in self.repo.by_doctor(doctor, from_minutes(start)[0]):
+            self._place(apt)
+        return SlotUnavailable(f"{doctor} is already booked at that time.", from_minutes(self._next_free(doctor, start)))
+
+    def book(self, patient, doctor, specialty, date, time):
+        start = to_minutes(date, time)
+        with self._lock:
+            self._check(doctor, start)
+            try:
+                apt = self.repo.book(patient, doctor, specialty, date, time)
+            except SlotTaken:
+                raise self._taken(doctor, start) from None
+            self._track(doctor, specialty)
+            self.calendars[doctor].add(apt.id, start)
+        return apt
+
+    # Either the appointment moves and its old slot is freed, or nothing
+    # changes: the slot check, the database update and the calendar update
+    # happen under the same lock. With `version`, a change made to the
+    # appointment elsewhere since it was read raises VersionConflict.
+    def reschedule(self, appointment_id, date, time, version=None):
+        start = to_minutes(date, time)
+        with self._lock:
+            apt = self.repo.get(appointment_id)
+            if apt is None:
+                raise KeyError(appointment_id)
+            self._track(apt.doctor, apt.specialty)
+            calendar = self.calendars[apt.doctor]
+            previous = calendar.bookings.get(appointment_id)
+            if previous is not None:
+                calendar.remove(appointment_id)
+            try:
+                self._check(apt.doctor, start)
+                if not self.repo.reschedule(appointment_id, date, time, version):
+                    raise KeyError(appointment_id)
+            except SlotTaken:
+                if previous is not None:
+                    calendar.add(appointment_id, previous)
+                raise self._taken(apt.doctor, start) from None
+            except Exception:
+                if previous is not None:
+                    calendar.add(appointment_id, previous)
+                raise
+            calendar.add(appointment_id, start)
+        return self.repo.get(appointment_id)
+
+    # Cancels the appointment and frees its slot. With `version`, a change
+    # made to it elsewhere since it was read raises VersionConflict.
+    def cancel(self, appointment_id, version=None):
+        with self._lock:
+            if not self.repo.set_status(appointment_id, CANCELLED, version):
+                return False
+            self._release(appointment_id)
+        return True
+
+    def _release(self, appointment_id):
+        for calendar in self.calendars.values():
+            if appointment_id in calendar.bookings:
+                calendar.remove(appointment_id)
+                return
@@ -0,0 +1,210 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Near-duplicate cache for free-text questions. Questions are reduced to a
+# set of content words, summarised by a MinHash signature and indexed with
+# LSH: the signature is cut into bands and every band is hashed into one
+# indexed integer column, so a lookup reads only the entries that share at
+# least one band instead of scanning the table. Candidates are then scored
+# by exact Jaccard similarity of their token sets.
+
+NUM_PERM = 64
+BANDS = 16                      # 16 bands x 4 rows: ~64% recall at J=0.5, >99% at J=0.75
+ROWS = NUM_PERM // BANDS
+MAX_CANDIDATES = 64
+_PRIME = (1 << 32) + 15         # > any 32-bit token hash, so (a*x + b) % p is a universal hash
+_WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a about am an and any are as at be can could do does dr each for from get give have how i if in is
+it its me my of on or per please should so some tell than that the there this to us was way we well
+what when which who why will with would you your
+""".split())
+
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, 1 << 31, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, NUM_PERM, dtype=np.uint64)
+
+
+def _stem(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokens(question):
+    return {_stem(w) for w in _WORD.findall(question.lower()) if w not in STOPWORDS}
+
+
+# Questions that lean on the conversation so far: too short to stand alone
+# ("and for dinner?"), opening with a connective ("what about kids?") or
+# pointing back at an earlier answer ("is that recipe vegan?"). Anything
+# else is answered and cached as if asked on its own.
+_CONNECTIVE = re.compile(r"^\s*(and|but|or|also|so|then|what about|how about|what if|why not)\b", re.IGNORECASE)
+_BACK_REFERENCE = re.compile(
+    r"\b(that|this|these|those|they|them|instead|else|again|above|earlier|previous|same|"
+    r"(make|cook|change|adapt|modify|swap|freeze|store) it|you (said|mentioned|suggested|recommended))\b",
+    re.IGNORECASE)
+
+
+def is_follow_up(question):
+    return (len(tokens(question)) < 2 or bool(_CONNECTIVE.search(question))
+            or bool(_BACK_REFERENCE.search(question)))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _hash32(token):
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def signature(token_set):
+    x = np.fromiter((_hash32(t) for t in token_set), dtype=np.uint64, count=len(token_set))
+    return ((np.outer(x, _A) + _B) % _PRIME).min(axis=0)
+
+
+# One signed 64-bit key per band, so all bands share a single index
+def band_keys(sig):
+    keys = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS:(band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(rows, digest_size=8, person=band.to_bytes(2, "little")).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+class SemanticMatch:
+    def __init__(self, id, question, answer, similarity, review_id):
+        self.id = id
+        self.question = question
+        self.answer = answer
+        self.similarity = similarity
+        self.review_id = review_id
+
+
+# `scope` separates answers given under different system prompts / models
+# (pass response_cache.cache_key("", ...)). Every hit is logged to the
+# `matches` table so false matches can be reviewed and flagged.
+class SemanticCache:
+    def __init__(self, path, threshold=0.75, ttl=7 * 24 * 3600):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            " id INTEGER PRIMARY KEY, scope TEXT NOT NULL, question TEXT NOT NULL,"
+            " tokens TEXT NOT NULL, answer TEXT NOT NULL, expires_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, id INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS bands_key ON bands (key);"
+            "CREATE INDEX IF NOT EXISTS bands_id ON bands (id);"
+            "CREATE INDEX IF NOT EXISTS questions_expiry ON questions (expires_at);"
+            "CREATE TABLE IF NOT EXISTS matches ("
+            " id INTEGER PRIMARY KEY, question TEXT NOT NULL, matched_id INTEGER NOT NULL,"
+            " matched_question TEXT NOT NULL, similarity REAL NOT NULL, created_at REAL NOT NULL,"
+            " false_match INTEGER);"
+        )
+        self._db.commit()
+
+    def lookup(self, question, scope):
+        query = tokens(question)
+        if not query:
+            return None
+        keys = band_keys(signature(query))
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT q.id, q.question, q.tokens, q.answer FROM questions q JOIN ("
+                "  SELECT id, COUNT(*) AS shared FROM bands"
+                f"  WHERE key IN ({','.join('?' * len(keys))}) GROUP BY id"
+                "  ORDER BY shared DESC LIMIT ?) c ON c.id = q.id"
+                " WHERE q.scope = ? AND q.expires_at > ?",
+                (*keys, MAX_CANDIDATES, scope, now),
+            ).fetchall()
+            best, best_score = None, 0.0
+            for row in rows:
+                score = jaccard(query, set(row[2].split(" ")))
+                if score > best_score:
+                    best, best_score = row, score
+            if best is None or best_score < self.threshold:
+                self.misses += 1
+                if best is not None:
+                    self.near_misses += 1
+                return None
+            self.hits += 1
+            cursor = self._db.execute(
+                "INSERT INTO matches (question, matched_id, matched_question, similarity, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (question, best[0], best[1], best_score, now),
+            )
+            self._db.commit()
+            return SemanticMatch(best[0], best[1], best[3], best_score, cursor.lastrowid)
+
+    def add(self, question, scope, answer):
+        query = tokens(question)
+        if not query:
+            return None
+        keys = band_keys(signature(query))
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO questions (scope, question, tokens, answer, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (scope, question, " ".join(sorted(query)), answer, time.time() + self.ttl),
+            )
+            self._db.executemany("INSERT INTO bands (key, id) VALUES (?, ?)",
+                                 [(key, cursor.lastrowid) for key in keys])
+            self._db.commit()
+        return cursor.lastrowid
+
+    # A reviewer (or the user) marks a served match as wrong. The cached
+    # question stays, but the pair is kept for tuning the threshold.
+    def flag(self, review_id, false_match=True):
+        with self._lock:
+            self._db.execute("UPDATE matches SET false_match = ? WHERE id = ?", (int(false_match), review_id))
+            self._db.commit()
+
+    # Lowest-similarity matches first: the ones most likely to be wrong
+    def review_queue(self, limit=50):
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, question, matched_question, similarity, created_at, false_match FROM matches"
+                " ORDER BY similarity ASC, id DESC LIMIT ?", (limit,)).fetchall()
+
+    def purge_expired(self):
+        with self._lock:
+            expired = "SELECT id FROM questions WHERE expires_at <= ?"
+            now = time.time()
+            self._db.execute(f"DELETE FROM bands WHERE id IN ({expired})", (now,))
+            removed = self._db.execute("DELETE FROM questions WHERE expires_at <= ?", (now,)).rowcount
+            self._db.commit()
+        return removed
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries, = self._db.execute("SELECT COUNT(*) FROM questions").fetchone()
+            reviewed, flagged = self._db.execute(
+                "SELECT COUNT(false_match), COALESCE(SUM(false_match), 0) FROM matches").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "near_misses": self.near_misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "reviewed": reviewed,
+            "false_matches": flagged,
+            "false_match_rate": flagged / reviewed if reviewed else 0.0,
+        }
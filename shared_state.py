@@ -0,0 +1,237 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+# State shared by every app.py replica. Backends speak a small Redis-style
+# vocabulary — get, set with an optional version check, delete, notify and
+# a change log — so the default SQLite file (shared by all processes on a
+# host through SQLite's file locking) and a Redis server are interchangeable.
+#
+# Every value carries a version that each write increments. Passing the
+# version a caller read makes the write conditional (optimistic
+# concurrency): if another replica wrote in between, VersionConflict is
+# raised and nothing changes. Every write and notify also appends the key to
+# the change log, which SharedState polls to invalidate its local read
+# cache and to call subscribers.
+
+CHANGE_LOG_SIZE = 10_000
+
+
+class VersionConflict(Exception):
+    def __init__(self, key, expected, actual):
+        super().__init__(f"{key} was changed elsewhere (expected version {expected}, found {actual})")
+        self.key = key
+        self.expected = expected
+        self.actual = actual
+
+
+class SQLiteBackend:
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, version INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS changes ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, origin TEXT NOT NULL);"
+        )
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value, version FROM kv WHERE key = ?", (key,)).fetchone()
+        return row if row else (None, 0)
+
+    # BEGIN IMMEDIATE takes the database write lock up front, so the version
+    # check and the write are one step for every process using the file.
+    def _write(self, key, expected, origin, value):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT version FROM kv WHERE key = ?", (key,)).fetchone()
+                current = row[0] if row else 0
+                if expected is not None and expected != current:
+                    raise VersionConflict(key, expected, current)
+                if value is None:
+                    self._db.execute("DELETE FROM kv WHERE key = ?", (key,))
+                else:
+                    self._db.execute("INSERT OR REPLACE INTO kv (key, value, version) VALUES (?, ?, ?)",
+                                     (key, value, current + 1))
+                self._log(key, origin)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return current + 1
+
+    def _log(self, key, origin):
+        seq = self._db.execute("INSERT INTO changes (key, origin) VALUES (?, ?)", (key, origin)).lastrowid
+        if seq % 1000 == 0:
+            self._db.execute("DELETE FROM changes WHERE seq <= ?", (seq - CHANGE_LOG_SIZE,))
+
+    def set(self, key, value, expected=None, origin=""):
+        return self._write(key, expected, origin, value)
+
+    def delete(self, key, expected=None, origin=""):
+        self._write(key, expected, origin, None)
+
+    def notify(self, key, origin=""):
+        with self._lock:
+            self._log(key, origin)
+
+    # (last seq, [(key, origin), ...]) for changes after `since`; with
+    # since=None only the current position is returned
+    def changes(self, since=None):
+        with self._lock:
+            if since is None:
+                return self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0], []
+            rows = self._db.execute("SELECT seq, key, origin FROM changes WHERE seq > ? ORDER BY seq",
+                                    (since,)).fetchall()
+        return (rows[-1][0] if rows else since), [(key, origin) for _, key, origin in rows]
+
+
+# Same contract on a Redis server (needs the `redis` package). Values live
+# in hashes with `value` and `version` fields; conditional writes use
+# WATCH/MULTI and the change log is a capped stream.
+class RedisBackend:
+    def __init__(self, url, prefix="drwell:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("DRWELL_STATE_URL points to Redis but the redis package is not installed") from None
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._watch_error = redis.WatchError
+        self.prefix = prefix
+        self._stream = prefix + "changes"
+
+    def get(self, key):
+        value, version = self._redis.hmget(self.prefix + key, "value", "version")
+        return (value, int(version)) if value is not None else (None, 0)
+
+    def _write(self, key, expected, origin, value):
+        name = self.prefix + key
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(name)
+                    current = int(pipe.hget(name, "version") or 0)
+                    if expected is not None and expected != current:
+                        raise VersionConflict(key, expected, current)
+                    pipe.multi()
+                    if value is None:
+                        pipe.delete(name)
+                    else:
+                        pipe.hset(name, mapping={"value": value, "version": current + 1})
+                    pipe.xadd(self._stream, {"key": key, "origin": origin}, maxlen=CHANGE_LOG_SIZE, approximate=True)
+                    pipe.execute()
+                    return current + 1
+                except self._watch_error:
+                    continue
+
+    def set(self, key, value, expected=None, origin=""):
+        return self._write(key, expected, origin, value)
+
+    def delete(self, key, expected=None, origin=""):
+        self._write(key, expected, origin, None)
+
+    def notify(self, key, origin=""):
+        self._redis.xadd(self._stream, {"key": key, "origin": origin}, maxlen=CHANGE_LOG_SIZE, approximate=True)
+
+    def changes(self, since=None):
+        if since is None:
+            last = self._redis.xrevrange(self._stream, count=1)
+            return (last[0][0] if last else "0-0"), []
+        entries = self._redis.xrange(self._stream, min=f"({since}")
+        return (entries[-1][0] if entries else since), [(e["key"], e["origin"]) for _, e in entries]
+
+
+def open_backend(url):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteBackend(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported state backend URL: {url}")
+
+
+# Process-side view of a backend: JSON values, a local read cache that the
+# change log keeps honest, and `subscribe(prefix, callback)` for keys other
+# replicas touched. The change log is read at most every `poll_interval`
+# seconds, from refresh() (once per script run) and from get().
+class SharedState:
+    def __init__(self, backend, poll_interval=0.5):
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.origin = uuid.uuid4().hex
+        self.hits = 0
+        self.misses = 0
+        self.conflicts = 0
+        self._cache = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._seq, _ = backend.changes()
+        self._polled = time.monotonic()
+
+    def subscribe(self, prefix, callback):
+        self._listeners.append((prefix, callback))
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._polled < self.poll_interval:
+                return
+            self._polled = now
+            self._seq, changes = self.backend.changes(self._seq)
+            remote = [key for key, origin in changes if origin != self.origin]
+            for key in remote:
+                self._cache.pop(key, None)
+        for key in dict.fromkeys(remote):
+            for prefix, callback in self._listeners:
+                if key.startswith(prefix):
+                    callback(key)
+
+    # (value, version); (default, 0) if the key does not exist
+    def get(self, key, default=None):
+        self.refresh()
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            cached = self.backend.get(key)
+            with self._lock:
+                self._cache[key] = cached
+        text, version = cached
+        return (json.loads(text) if text is not None else default), version
+
+    # `expected=0` only creates; any other version must match the stored one
+    def set(self, key, value, expected=None):
+        text = json.dumps(value)
+        try:
+            version = self.backend.set(key, text, expected, origin=self.origin)
+        except VersionConflict:
+            self.conflicts += 1
+            with self._lock:
+                self._cache.pop(key, None)
+            raise
+        with self._lock:
+            self._cache[key] = (text, version)
+        return version
+
+    def delete(self, key, expected=None):
+        try:
+            self.backend.delete(key, expected, origin=self.origin)
+        except VersionConflict:
+            self.conflicts += 1
+            raise
+        finally:
+            with self._lock:
+                self._cache.pop(key, None)
+
+    def notify(self, key):
+        self.backend.notify(key, origin=self.origin)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "conflicts": self.conflicts, "cached": len(self._cache)}
@@ -0,0 +1,181 @@
+import json
+import os
+import re
+import threading
+
+DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "substitutions.json")
+COMPLETIONS_PER_NODE = 8
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def singular(word):
+    if len(word) <= 3 or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("oes") or word.endswith(("ches", "shes", "xes", "zes", "sses")):
+        return word[:-2]
+    if word.endswith("ves"):
+        return word[:-3] + "f"
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def normalize(text):
+    return " ".join(singular(w) for w in _WORD.findall(text.lower()))
+
+
+def deletions(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class Match:
+    def __init__(self, key, entry, kind, matched):
+        self.key = key
+        self.entry = entry
+        self.kind = kind          # "exact", "alias", "fuzzy"
+        self.matched = matched    # the indexed name that matched the query
+
+    def __repr__(self):
+        return f"Match({self.key!r}, kind={self.kind!r}, matched={self.matched!r})"
+
+
+# In-memory lookup index over the bundled substitution dataset plus answers
+# learned from Dr. Well. Names and aliases are normalized (lower case,
+# punctuation stripped, singular), then indexed three ways:
+#   - a dict for exact / alias hits,
+#   - a prefix trie whose nodes keep their first few names, for autocomplete,
+#   - an inverted index of words and their one-letter deletions, for
+#     misspelled ("suger") queries and "Did you mean" suggestions.
+class SubstitutionIndex:
+    def __init__(self, dataset=DATASET, learned_path=None):
+        self.entries = {}
+        self.learned_path = learned_path
+        self._names = {}
+        self._trie = {}
+        self._words = {}
+        self._deletes = {}
+        self._lock = threading.Lock()
+        with open(dataset, encoding="utf-8") as f:
+            for key, entry in json.load(f).items():
+                self._add(key, entry)
+        if learned_path and os.path.exists(learned_path):
+            with open(learned_path, encoding="utf-8") as f:
+                for key, entry in json.load(f).items():
+                    self._add(key, entry)
+
+    def _add(self, key, entry):
+        self.entries[key] = entry
+        for name in [key] + entry.get("aliases", []):
+            norm = normalize(name)
+            if not norm:
+                continue
+            self._names.setdefault(norm, (key, name))
+            node = self._trie
+            for char in norm:
+                node = node.setdefault(char, {})
+                names = node.setdefault("", [])
+                if len(names) < COMPLETIONS_PER_NODE and name not in names:
+                    names.append(name)
+            for word in norm.split():
+                self._words.setdefault(word, set()).add(norm)
+                for deleted in deletions(word):
+                    self._deletes.setdefault(deleted, set()).add(word)
+
+    # Only confident matches are answered locally: the exact name, an alias,
+    # or one of those with a single misspelled word ("suger", "brown suger").
+    # A query that merely shares words with a name ("sweet potato", "baking
+    # soda") returns None and goes to Dr. Well; see related().
+    def lookup(self, query):
+        norm = normalize(query)
+        if not norm:
+            return None
+        hit = self._names.get(norm)
+        if hit is not None:
+            key, name = hit
+            return Match(key, self.entries[key], "exact" if name == key else "alias", name)
+        words = norm.split()
+        unknown = [i for i, word in enumerate(words) if word not in self._words]
+        if len(unknown) != 1:
+            return None
+        i = unknown[0]
+        for corrected in self._corrections(words[i]):
+            hit = self._names.get(" ".join(words[:i] + [corrected] + words[i + 1:]))
+            if hit is not None:
+                key, name = hit
+                return Match(key, self.entries[key], "fuzzy", name)
+        return None
+
+    # The indexed name closest to a query lookup() does not answer, for "Did
+    # you mean" suggestions: the one sharing the most (spell-corrected) words.
+    def related(self, query):
+        words = normalize(query).split()
+        corrected = [w if w in self._words else next(iter(self._corrections(w)), None) for w in words]
+        best = self._best_name([w for w in corrected if w], words)
+        return self._names[best][1] if best is not None else None
+
+    # Picks the indexed name sharing the most words with the query, breaking
+    # ties toward names with no extra words (so "sugar" beats "brown sugar").
+    def _best_name(self, words, query_words):
+        scores = {}
+        for word in set(words):
+            for norm in self._words.get(word, ()):
+                scores[norm] = scores.get(norm, 0) + 1
+        if not scores:
+            return None
+        return max(scores, key=lambda n: (scores[n], -len(set(n.split()) - set(query_words)), -len(n)))
+
+    # Indexed words within one edit of `word`, closest length first
+    def _corrections(self, word):
+        candidates = set(self._deletes.get(word, ()))
+        for deleted in deletions(word):
+            if deleted in self._words:
+                candidates.add(deleted)
+            candidates |= self._deletes.get(deleted, set())
+        return sorted(candidates, key=lambda c: (abs(len(c) - len(word)), c))
+
+    def complete(self, prefix, limit=COMPLETIONS_PER_NODE):
+        node = self._trie
+        for char in normalize(prefix) if prefix.strip() else "":
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get("", [])[:limit] if node is not self._trie else []
+
+    # Autocomplete for the ingredient box: prefix completions, or the closest
+    # indexed name when nothing starts with what was typed. Omits the query
+    # itself.
+    def suggest(self, query, limit=COMPLETIONS_PER_NODE):
+        norm = normalize(query)
+        names = self.complete(query, limit)
+        if not names:
+            match = self.lookup(query)
+            related = match.matched if match is not None else self.related(query)
+            names = [related] if related else []
+        return [name for name in names if normalize(name) != norm]
+
+    # Stores an answer from Dr. Well so the next lookup is served locally.
+    def learn(self, ingredient, answer):
+        key = ingredient.strip().lower()
+        entry = {"aliases": [], "substitutes": [], "answer": answer, "source": "Dr. Well"}
+        with self._lock:
+            self._add(key, entry)
+            if self.learned_path:
+                learned = {k: e for k, e in self.entries.items() if e.get("source") == "Dr. Well"}
+                tmp = self.learned_path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(learned, f, ensure_ascii=False)
+                os.replace(tmp, self.learned_path)
+        return Match(key, entry, "exact", key)
+
+
+def format_answer(match):
+    entry = match.entry
+    if entry.get("answer"):
+        return entry["answer"]
+    lines = [f"Here are some healthier substitutes for **{match.key}**:", ""]
+    for sub in entry["substitutes"]:
+        lines.append(f"- **{sub['name']}** ({sub['ratio']}): {sub['notes']}")
+    lines += ["", "- Dr. Well"]
+    return "\n".join(lines)
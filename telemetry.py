@@ -0,0 +1,276 @@
+import atexit
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process metrics for the hot paths of app.py, exposed in the Prometheus
+# text format and optionally mirrored to a JSONL file. Metrics are plain
+# dicts of label tuples guarded by one lock, so recording costs a dict update.
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, registry, name, help):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.emit(self.name, amount, labels)
+
+    def value(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+    def render(self):
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in self.values.items()]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, registry, name, help, max_series=None):
+        super().__init__(registry, name, help)
+        self.max_series = max_series
+        self.values = OrderedDict()
+
+    def set(self, value, **labels):
+        key = _label_key(labels)
+        with self.registry.lock:
+            self.values[key] = value
+            self.values.move_to_end(key)
+            if self.max_series is not None:
+                while len(self.values) > self.max_series:
+                    self.values.popitem(last=False)
+
+    def render(self):
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in self.values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, buckets=SECONDS_BUCKETS):
+        super().__init__(registry, name, help)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.registry.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+            series[2] += 1
+        self.registry.emit(self.name, value, labels)
+
+    def snapshot(self, **labels):
+        series = self.values.get(_label_key(labels))
+        if series is None:
+            return {"count": 0, "sum": 0.0}
+        return {"count": series[2], "sum": series[1]}
+
+    def render(self):
+        lines = []
+        for key, (counts, total, count) in self.values.items():
+            running = 0
+            for bound, bucket in zip(self.buckets + (float("inf"),), counts):
+                running += bucket
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+# Appends one JSON object per observation; writes are buffered and flushed
+# every `flush_every` events or `flush_interval` seconds.
+class JsonlSink:
+    def __init__(self, path, flush_every=64, flush_interval=2.0):
+        self._file = open(path, "a", buffering=1 << 16)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        atexit.register(self.flush)
+
+    def write(self, record):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._pending += 1
+            now = time.monotonic()
+            if self._pending >= self.flush_every or now - self._last_flush >= self.flush_interval:
+                self._flush(now)
+
+    def flush(self):
+        with self._lock:
+            self._flush(time.monotonic())
+
+    def _flush(self, now):
+        self._file.flush()
+        self._pending = 0
+        self._last_flush = now
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+        self.collectors = []
+        self.sink = None
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help):
+        return self._add(Counter(self, name, help))
+
+    def gauge(self, name, help, max_series=None):
+        return self._add(Gauge(self, name, help, max_series))
+
+    def histogram(self, name, help, buckets=SECONDS_BUCKETS):
+        return self._add(Histogram(self, name, help, buckets))
+
+    # `collector` is called at scrape time and returns {name: (help, value)}
+    # for gauges that are cheaper to read on demand than to keep updated.
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def emit(self, name, value, labels):
+        if self.sink is not None:
+            self.sink.write({"ts": time.time(), "metric": name, "value": value, **labels})
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.extend(metric.header())
+                lines.extend(metric.render())
+        for collector in self.collectors:
+            try:
+                collected = collector()
+            except Exception:
+                continue
+            for name, (help, value) in collected.items():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {_format_value(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PAGE_RENDER_SECONDS = REGISTRY.histogram(
+    "drwell_page_render_seconds", "Wall time of page functions called from the main router.")
+LLM_LATENCY_SECONDS = REGISTRY.histogram(
+    "drwell_llm_latency_seconds", "Groq request latency from request to final token, by system role and mode.")
+LLM_TTFT_SECONDS = REGISTRY.histogram(
+    "drwell_llm_time_to_first_token_seconds", "Time to the first streamed token, by system role.")
+LLM_TOKENS = REGISTRY.histogram(
+    "drwell_llm_tokens", "Prompt and completion tokens per Groq request, by system role.", TOKEN_BUCKETS)
+LLM_TOKENS_TOTAL = REGISTRY.counter(
+    "drwell_llm_tokens_total", "Prompt and completion tokens sent to Groq, by system role.")
+LLM_ERRORS = REGISTRY.counter(
+    "drwell_llm_errors_total", "Groq requests that ended in an error, by system role.")
+CACHE_REQUESTS = REGISTRY.counter(
+    "drwell_cache_requests_total", "Cache lookups by cache name and result (hit or miss).")
+SEMANTIC_REVIEWS = REGISTRY.counter(
+    "drwell_semantic_cache_reviews_total", "Semantic cache answers reviewed by users, by verdict.")
+SCRIPT_RUNS = REGISTRY.counter(
+    "drwell_script_runs_total", "Full Streamlit script runs across all sessions.")
+SESSION_RERUNS = REGISTRY.gauge(
+    "drwell_session_script_runs", "Script runs per session (most recent 200 sessions).", max_series=200)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+def record_tokens(system_role, prompt_tokens, completion_tokens):
+    for kind, count in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+        if count is None:
+            continue
+        LLM_TOKENS.observe(count, system_role=system_role, kind=kind)
+        LLM_TOKENS_TOTAL.inc(count, system_role=system_role, kind=kind)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def enable_jsonl(path):
+    REGISTRY.sink = JsonlSink(path)
+
+
+# Serves GET /metrics on a daemon thread. Returns the server, or None when
+# the port is taken (for example by another replica on the same host).
+def start_http_server(port, host="127.0.0.1", registry=REGISTRY):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError:
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
@@ -0,0 +1,7 @@
+# Token estimates for budgeting requests and chat history. Kept free of the
+# groq/httpx imports so pages that only budget history stay light.
+
+
+def estimate_tokens(messages):
+    # Roughly four characters per token for English text, plus framing.
+    return sum(len(m["content"]) // 4 + 4 for m in messages)
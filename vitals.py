@@ -0,0 +1,174 @@
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+from metrics_store import TIMESTAMP
+
+# Rolling vital-sign statistics for the dashboard cards and the sidebar.
+# Each vital keeps a time window of recent samples with running sums and
+# monotonic min/max deques, so adding a sample, expiring old ones and
+# reading mean/std/min/max are all O(1) amortized, independent of history.
+
+HOUR = 3600
+DAY = 24 * HOUR
+Z_ANOMALY = 3.0
+MIN_SAMPLES_FOR_Z = 10
+
+
+class RollingWindow:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.samples = deque()
+        self._mins = deque()
+        self._maxs = deque()
+        self._shift = None      # first value seen; sums are kept relative to it
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self.latest = None
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def newest(self):
+        return self.samples[-1][0] if self.samples else None
+
+    def add(self, ts, value):
+        if self._shift is None:
+            self._shift = value
+        d = value - self._shift
+        self.samples.append((ts, value))
+        self._sum += d
+        self._sumsq += d * d
+        while self._mins and self._mins[-1][1] >= value:
+            self._mins.pop()
+        self._mins.append((ts, value))
+        while self._maxs and self._maxs[-1][1] <= value:
+            self._maxs.pop()
+        self._maxs.append((ts, value))
+        self.latest = value
+        self.expire(ts)
+
+    def expire(self, now):
+        cutoff = now - self.seconds
+        while self.samples and self.samples[0][0] <= cutoff:
+            ts, value = self.samples.popleft()
+            d = value - self._shift
+            self._sum -= d
+            self._sumsq -= d * d
+            if self._mins[0][0] == ts:
+                self._mins.popleft()
+            if self._maxs[0][0] == ts:
+                self._maxs.popleft()
+        if not self.samples:
+            self._shift, self._sum, self._sumsq = None, 0.0, 0.0
+
+    def total(self):
+        return self._sum + len(self.samples) * (self._shift or 0.0)
+
+    def mean(self):
+        return self.total() / len(self.samples) if self.samples else None
+
+    def std(self):
+        n = len(self.samples)
+        if n < 2:
+            return None
+        return math.sqrt(max(self._sumsq - self._sum * self._sum / n, 0.0) / (n - 1))
+
+    def min(self):
+        return self._mins[0][1] if self._mins else None
+
+    def max(self):
+        return self._maxs[0][1] if self._maxs else None
+
+
+# Display rules per vital. `value` picks the statistic shown on the card,
+# `bands` maps (upper bound, css class, label) in increasing order, and
+# `gauge` is the value that fills the sidebar bar.
+VITALS = {
+    "Heart Rate": {
+        "window": DAY, "value": "mean", "unit": "BPM", "format": "{:.0f}", "gauge": 120,
+        "bands": [(60, "status-warning", "! Below Normal"), (100, "status-normal", "✓ Normal Range"),
+                  (math.inf, "status-warning", "! Above Normal")],
+    },
+    "Blood Pressure": {
+        "window": DAY, "value": "mean", "unit": "mmHg", "format": "{:.0f}", "gauge": 160,
+        "bands": [(120, "status-normal", "✓ Optimal"), (130, "status-warning", "! Elevated"),
+                  (math.inf, "status-warning", "! High")],
+    },
+    "Sleep Hours": {
+        "window": 7 * DAY, "value": "mean", "unit": "hrs", "format": "{:.1f}", "gauge": 9,
+        "bands": [(6, "status-warning", "! Sleep Deprived"), (7, "status-warning", "! Slightly Short"),
+                  (math.inf, "status-normal", "✓ Well Rested")],
+    },
+    "Steps": {
+        "window": DAY, "value": "total", "unit": "", "format": "{:,.0f}", "gauge": 10000,
+        "bands": [(10000, "status-warning", "! Below Target"), (math.inf, "status-normal", "✓ Target Reached")],
+    },
+}
+
+
+class VitalsMonitor:
+    def __init__(self, store, patient, vitals=VITALS):
+        self.store = store
+        self.patient = str(patient)
+        self.vitals = vitals
+        self.windows = {}
+        self.anomalies = {}
+        self._lock = threading.Lock()
+        self.reload()
+        store.subscribe(self._on_append)
+
+    # Seeds the windows from the trailing span of the store; also used when
+    # samples arrive out of order, which a rolling window cannot absorb.
+    def reload(self):
+        bounds = self.store.bounds(self.patient)
+        with self._lock:
+            self.windows = {name: RollingWindow(rule["window"]) for name, rule in self.vitals.items()}
+            self.anomalies = {name: False for name in self.vitals}
+            if bounds is None:
+                return
+            span = max(rule["window"] for rule in self.vitals.values())
+            start = bounds[1] - span
+            data = self.store.read(self.patient, start=np.datetime64(start, "s"),
+                                   end=np.datetime64(bounds[1] + 1, "s"), columns=list(self.vitals))
+            self._ingest(data[TIMESTAMP], data)
+
+    def _on_append(self, patient, timestamps, values):
+        if str(patient) != self.patient or not len(timestamps):
+            return
+        with self._lock:
+            newest = max((w.newest for w in self.windows.values() if w.newest is not None), default=None)
+            in_order = newest is None or timestamps[0] > newest
+            if in_order:
+                self._ingest(timestamps, values)
+        if not in_order:
+            self.reload()
+
+    def _ingest(self, timestamps, values):
+        for name, window in self.windows.items():
+            column = values.get(name)
+            if column is None:
+                continue
+            keep = ~np.isnan(column)
+            for ts, value in zip(timestamps[keep].tolist(), column[keep].astype(np.float64).tolist()):
+                mean, std = window.mean(), window.std()
+                self.anomalies[name] = (std is not None and std > 0 and len(window) >= MIN_SAMPLES_FOR_Z
+                                        and abs(value - mean) > Z_ANOMALY * std)
+                window.add(ts, value)
+
+    def summary(self, name):
+        rule = self.vitals[name]
+        with self._lock:
+            window = self.windows[name]
+            if not len(window):
+                return None
+            value = window.total() if rule["value"] == "total" else window.mean()
+            stats = {"mean": window.mean(), "std": window.std(), "min": window.min(), "max": window.max(),
+                     "latest": window.latest, "samples": len(window), "anomaly": self.anomalies[name]}
+        css, label = next((css, label) for bound, css, label in rule["bands"] if value < bound)
+        stats.update(value=value, text=rule["format"].format(value), unit=rule["unit"], css=css, label=label,
+                     gauge=min(1.0, max(0.0, value / rule["gauge"])))
+        return stats